@@ -1,19 +1,22 @@
 import pandas as pd
-import re
 
-KEYWORDS = ["must", "should", "report", "ensure", "immediately", "required", "mandatory"]
+from app.agent.rule_engine import DEFAULT_RULES, DEFAULT_SUGGESTION, PolicyRuleEngine, scan_corpus
 
-def analyze_policies(text):
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-    flagged = []
+KEYWORDS = [rule.keyword for rule in DEFAULT_RULES]
 
-    for line in lines:
-        hits = [kw for kw in KEYWORDS if re.search(rf"\b{kw}\b", line, re.IGNORECASE)]
-        if hits:
-            flagged.append({
-                "Sentence": line,
-                "Keywords Found": ", ".join(hits),
-                "Suggestion": "Clarify responsibility or action" if "should" in hits else "Check policy compliance"
-            })
+_default_engine = PolicyRuleEngine()
 
-    return pd.DataFrame(flagged)
+def analyze_policies(text, rules=None):
+    """Flags lines containing policy keywords. Pass `rules` (a sequence of Rule) to override DEFAULT_RULES."""
+    engine = _default_engine if rules is None else PolicyRuleEngine(rules)
+    columns = engine.scan(text)
+    if not columns["Sentence"]:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
+
+def analyze_policy_corpus(documents, rules=None, workers=None):
+    """Runs analyze_policies over many (name, text) pairs across a process pool, with a Document column."""
+    columns = scan_corpus(documents, DEFAULT_RULES if rules is None else rules, DEFAULT_SUGGESTION, workers)
+    if not columns["Sentence"]:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
@@ -0,0 +1,118 @@
+# File: app/agent/rule_engine.py
+
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# keyword: a word or phrase, matched case-insensitively on word boundaries.
+# suggestion: shown for lines where this is the highest-priority rule that fired (None: no opinion).
+Rule = namedtuple("Rule", ["keyword", "suggestion", "priority"], defaults=[None, 0])
+
+DEFAULT_SUGGESTION = "Check policy compliance"
+DEFAULT_RULES = (
+    Rule("must"),
+    Rule("should", "Clarify responsibility or action", 1),
+    Rule("report"),
+    Rule("ensure"),
+    Rule("immediately"),
+    Rule("required"),
+    Rule("mandatory"),
+)
+
+class PolicyRuleEngine:
+    """
+    Matches a rule set against text in one pass.
+
+    All keywords and phrases are compiled once into a single case-insensitive alternation
+    (longest first, so where two rules overlap at the same position the longer phrase wins),
+    and the text is scanned once with finditer instead of once per keyword per line.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES, default_suggestion: str = DEFAULT_SUGGESTION):
+        self.rules = tuple(Rule(*rule) if not isinstance(rule, Rule) else rule for rule in rules)
+        if not self.rules:
+            raise ValueError("PolicyRuleEngine needs at least one rule.")
+        self.default_suggestion = default_suggestion
+        by_length = sorted(range(len(self.rules)), key=lambda i: -len(self.rules[i].keyword))
+        same_line_space = r"[^\S\n]+" # Phrases may be spaced out but never span lines
+        alternation = "|".join(
+            f"(?P<r{i}>{same_line_space.join(map(re.escape, self.rules[i].keyword.split()))})" for i in by_length
+        )
+        # Cheap first-character lookahead so the alternation is only tried where a rule can start
+        first_chars = "".join(sorted({c for rule in self.rules for c in (rule.keyword[0].lower(), rule.keyword[0].upper())}))
+        self._pattern = re.compile(rf"\b(?=[{re.escape(first_chars)}])(?:{alternation})\b", re.IGNORECASE)
+
+    def scan(self, text: str):
+        """
+        Returns the flagged lines as columns: {"Sentence": [...], "Keywords Found": [...],
+        "Suggestion": [...]}, in line order. Keywords are listed in rule-set order.
+        """
+        sentences, keywords, suggestions = [], [], []
+        line_end = -1
+        fired = None
+        for match in self._pattern.finditer(text):
+            if match.start() > line_end: # First hit on a new line
+                if fired:
+                    self._append(fired, keywords, suggestions)
+                line_start = text.rfind("\n", 0, match.start()) + 1
+                line_end = text.find("\n", match.start())
+                if line_end == -1:
+                    line_end = len(text)
+                sentences.append(text[line_start:line_end].strip())
+                fired = set()
+            fired.add(int(match.lastgroup[1:]))
+        if fired:
+            self._append(fired, keywords, suggestions)
+        return {"Sentence": sentences, "Keywords Found": keywords, "Suggestion": suggestions}
+
+    def _append(self, fired, keywords, suggestions):
+        fired = sorted(fired)
+        keywords.append(", ".join(self.rules[i].keyword for i in fired))
+        suggestions.append(self._suggestion(fired))
+
+    def _suggestion(self, fired):
+        best = None
+        for i in fired:
+            rule = self.rules[i]
+            if rule.suggestion is not None and (best is None or rule.priority > best.priority):
+                best = rule
+        return best.suggestion if best else self.default_suggestion
+
+@lru_cache(maxsize=8)
+def _engine(rules, default_suggestion):
+    """Compiled engine per rule set, so each worker process compiles it only once."""
+    return PolicyRuleEngine(rules, default_suggestion)
+
+def _scan_document(args):
+    name, text, rules, default_suggestion = args
+    columns = _engine(rules, default_suggestion).scan(text)
+    columns["Document"] = [name] * len(columns["Sentence"])
+    return columns
+
+def scan_corpus(documents, rules=DEFAULT_RULES, default_suggestion: str = DEFAULT_SUGGESTION, workers: int = None):
+    """
+    Scans many documents across a process pool.
+
+    Args:
+        documents: Iterable of (name, text) pairs.
+        workers: Process count (default: one per CPU). 1 scans in-process.
+
+    Returns:
+        Columns as from PolicyRuleEngine.scan plus a "Document" column, in input order.
+    """
+    rules = tuple(Rule(*rule) if not isinstance(rule, Rule) else rule for rule in rules)
+    tasks = ((name, text, rules, default_suggestion) for name, text in documents)
+    columns = {"Document": [], "Sentence": [], "Keywords Found": [], "Suggestion": []}
+
+    def collect(results):
+        for result in results:
+            for key in columns:
+                columns[key].extend(result[key])
+
+    if workers == 1:
+        collect(map(_scan_document, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            collect(pool.map(_scan_document, tasks, chunksize=4))
+    return columns
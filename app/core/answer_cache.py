@@ -0,0 +1,90 @@
+# File: app/core/answer_cache.py
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from app.core import metrics
+
+metrics.describe("docqa_answer_cache_lookups_total", "counter", "Answer cache lookups, by result (hit or miss).")
+
+class AnswerCache:
+    """
+    In-memory cache of generated answers, so a question that was already answered (or a
+    near-identical rewording of it) skips retrieval and the LLM.
+
+    Entries are keyed by the index version they were answered against and a scope (which
+    documents were searchable), and match when the cosine similarity of the question
+    embeddings is at least `similarity`. Any change of the index version drops every entry,
+    so answers never outlive the documents they came from.
+    """
+
+    def __init__(self, max_entries: int = 512, similarity: float = 0.95):
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._entries = OrderedDict() # id -> (scope, unit question embedding, answer); LRU order
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, question_embedding: np.ndarray, version, scope=None):
+        """Returns the cached answer of the most similar question in scope, or None."""
+        if self.max_entries <= 0:
+            return None
+        query = _unit(question_embedding)
+        answer = None
+        with self._lock:
+            self._check_version(version)
+            best_id, best = None, self.similarity
+            for entry_id, (entry_scope, embedding, _) in self._entries.items():
+                if entry_scope == scope:
+                    similarity = float(embedding @ query)
+                    if similarity >= best:
+                        best_id, best = entry_id, similarity
+            if best_id is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(best_id)
+                self.hits += 1
+                answer = self._entries[best_id][2]
+        metrics.inc("docqa_answer_cache_lookups_total", result="miss" if answer is None else "hit")
+        return answer
+
+    def put(self, question_embedding: np.ndarray, version, answer: str, scope=None):
+        """
+        Caches an answer produced against index version. Answers for an older version than the
+        current one (the index changed while generating) are not stored.
+        """
+        if self.max_entries <= 0 or not answer:
+            return
+        with self._lock:
+            if self._version is not None and version < self._version:
+                return
+            self._check_version(version)
+            self._entries[self._next_id] = (scope, _unit(question_embedding), answer)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self):
+        """Hit/miss counters since the cache was created."""
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries), "index_version": self._version}
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
@@ -0,0 +1,164 @@
+# File: app/core/chunk_store.py
+
+import mmap
+import os
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+import numpy as np
+
+CHUNKS_FILE = "chunks.bin"    # UTF-8 chunk texts, back to back (zlib blocks of them when compressed)
+OFFSETS_FILE = "offsets.bin"  # int64 end offset of each chunk in the (uncompressed) text
+BLOCKS_FILE = "blocks.bin"    # Compressed stores only: int64 (first chunk, end offset in CHUNKS_FILE) per block
+BLOCK_BYTES = 16 * 1024       # Uncompressed text per compressed block
+CACHED_BLOCKS = 64            # Decompressed blocks kept in memory
+
+class ChunkStore:
+    """
+    List-like container of text chunks that can be persisted to an append-only directory.
+
+    All text lives in one contiguous UTF-8 buffer indexed by an array of end offsets, and a
+    chunk is only decoded into a str when it is accessed (e.g. for the top-k hits of a search).
+    Flushed chunks are read back through a memory map, so opening a large store does not copy
+    the corpus into the Python heap; chunks added since the last flush are kept in a bytearray.
+
+    With compress=True, flushed text is stored as zlib-compressed blocks of about BLOCK_BYTES,
+    and reading a chunk decompresses only its block (recently used blocks are cached).
+    """
+
+    def __init__(self, directory: str = None, compress: bool = False):
+        self.directory = directory
+        self.compress = compress
+        self._blob = None           # mmap of CHUNKS_FILE
+        self._ends = None           # memmap of OFFSETS_FILE
+        self._blocks = None         # (first chunk ids, end offsets in CHUNKS_FILE) of compressed blocks
+        self._persisted_count = 0
+        self._persisted_bytes = 0   # Uncompressed
+        self._pending = bytearray() # UTF-8 text of chunks added since the last flush
+        self._pending_ends = array("q") # End offset of each pending chunk in _pending
+        self._block_cache = OrderedDict() # block -> (decompressed text, its offset in the uncompressed text)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory: str, count: int, compress: bool = False):
+        """Maps the first `count` chunks stored in `directory`."""
+        store = cls(directory, compress=compress)
+        store._map(count)
+        return store
+
+    def _map(self, count: int):
+        self.close()
+        self._persisted_count = count
+        self._persisted_bytes = 0
+        if count == 0:
+            return
+        self._ends = np.memmap(os.path.join(self.directory, OFFSETS_FILE), dtype=np.int64, mode="r", shape=(count,))
+        self._persisted_bytes = int(self._ends[-1])
+        if self.compress:
+            blocks = np.fromfile(os.path.join(self.directory, BLOCKS_FILE), dtype=np.int64).reshape(-1, 2)
+            blocks = blocks[blocks[:, 0] < count] # Blocks past `count` are from an interrupted flush
+            self._blocks = (np.ascontiguousarray(blocks[:, 0]), np.ascontiguousarray(blocks[:, 1]))
+        with open(os.path.join(self.directory, CHUNKS_FILE), "rb") as f:
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._persisted_bytes else None
+
+    def close(self):
+        """Releases the memory maps; pending chunks are kept."""
+        if self._blob is not None:
+            self._blob.close()
+        self._blob = None
+        self._ends = None
+        self._blocks = None
+        with self._lock:
+            self._block_cache.clear()
+
+    def flush(self):
+        """
+        Appends pending chunks to the store directory. Existing chunk data is never rewritten;
+        anything past the last flushed chunk (e.g. from an interrupted flush) is truncated first.
+        """
+        if self.directory is None:
+            raise ValueError("ChunkStore has no directory to flush to.")
+        os.makedirs(self.directory, exist_ok=True)
+        num_blocks = len(self._blocks[0]) if self._blocks is not None else 0
+        stored_bytes = int(self._blocks[1][-1]) if num_blocks else self._persisted_bytes
+        self.close()
+
+        ends = self._persisted_bytes + np.frombuffer(self._pending_ends, dtype=np.int64)
+        with open(os.path.join(self.directory, CHUNKS_FILE), "ab") as f:
+            f.truncate(stored_bytes)
+            if not self.compress:
+                f.write(self._pending)
+            else:
+                with open(os.path.join(self.directory, BLOCKS_FILE), "ab") as blocks:
+                    blocks.truncate(num_blocks * 16)
+                    for first, start, stop in self._pending_blocks():
+                        data = zlib.compress(memoryview(self._pending)[start:stop])
+                        f.write(data)
+                        stored_bytes += len(data)
+                        blocks.write(np.array([first, stored_bytes], dtype=np.int64).tobytes())
+        with open(os.path.join(self.directory, OFFSETS_FILE), "ab") as f:
+            f.truncate(self._persisted_count * 8)
+            f.write(ends.tobytes())
+
+        count = len(self)
+        self._pending = bytearray()
+        self._pending_ends = array("q")
+        self._map(count)
+
+    def _pending_blocks(self):
+        """Splits pending text at chunk boundaries into (first chunk id, start, stop) blocks of ~BLOCK_BYTES."""
+        first, start = 0, 0
+        for i, end in enumerate(self._pending_ends):
+            if end - start >= BLOCK_BYTES or i == len(self._pending_ends) - 1:
+                yield self._persisted_count + first, start, end
+                first, start = i + 1, end
+
+    def _block(self, block: int):
+        """Decompressed text of a block and its offset in the uncompressed text."""
+        with self._lock:
+            cached = self._block_cache.get(block)
+            if cached is not None:
+                self._block_cache.move_to_end(block)
+                return cached
+        start = int(self._blocks[1][block - 1]) if block > 0 else 0
+        first = int(self._blocks[0][block])
+        cached = (zlib.decompress(self._blob[start:int(self._blocks[1][block])]),
+                  int(self._ends[first - 1]) if first > 0 else 0)
+        with self._lock:
+            self._block_cache[block] = cached
+            while len(self._block_cache) > CACHED_BLOCKS:
+                self._block_cache.popitem(last=False)
+        return cached
+
+    def append(self, chunk: str):
+        self._pending += chunk.encode("utf-8")
+        self._pending_ends.append(len(self._pending))
+
+    def extend(self, chunks):
+        for chunk in chunks:
+            self.append(chunk)
+
+    def __len__(self):
+        return self._persisted_count + len(self._pending_ends)
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("chunk index out of range")
+        if i >= self._persisted_count:
+            i -= self._persisted_count
+            return self._pending[self._pending_ends[i - 1] if i > 0 else 0:self._pending_ends[i]].decode("utf-8")
+        if self._blob is None:
+            return ""
+        start = int(self._ends[i - 1]) if i > 0 else 0
+        stop = int(self._ends[i])
+        if self._blocks is None:
+            return self._blob[start:stop].decode("utf-8")
+        text, offset = self._block(int(np.searchsorted(self._blocks[0], i, side="right")) - 1)
+        return text[start - offset:stop - offset].decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -0,0 +1,80 @@
+# File: app/core/context_packer.py
+
+import re
+
+import numpy as np
+
+from app.core import metrics
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n') # Sentence ends and blank lines (table rows, headings)
+_SPACES = re.compile(r'\s+')
+DUPLICATE_SIMILARITY = 0.95 # Sentences at least this similar to an already packed one add nothing
+
+metrics.describe("docqa_context_sentences_total", "counter",
+                 "Retrieved sentences by packing outcome (packed, duplicate or over_budget).")
+metrics.describe("docqa_context_tokens", "histogram", "LLM tokens of packed context per prompt.",
+                 (64, 128, 256, 512, 768, 1024, 1536, 2048))
+
+
+def context_budget(empty_prompt: str, count_tokens, n_ctx: int, max_tokens: int, limit: int = None) -> int:
+    """
+    Tokens left for the context in a prompt that is empty_prompt without it, after reserving
+    max_tokens for the answer, capped at limit.
+    """
+    available = n_ctx - max_tokens - count_tokens(empty_prompt) - 1 # -1 for BOS
+    return max(0, min(available, limit) if limit else available)
+
+
+def pack_context(question_embedding: np.ndarray, chunks, embedder, count_tokens, budget: int,
+                 separator: str = "\n", duplicate_similarity: float = DUPLICATE_SIMILARITY) -> str:
+    """
+    Builds the prompt context from retrieved chunks (best first) within budget tokens.
+
+    Chunks are split into sentences, and exact and near-duplicate sentences (e.g. from
+    overlapping chunks) are dropped. The sentences most similar to the question are packed
+    until the budget is used. They are emitted in their original order, chunk by chunk, so
+    the context still reads as text. count_tokens must count tokens of the LLM's tokenizer.
+    """
+    with metrics.timer("pack"):
+        sentences, seen, duplicates = [], set(), 0 # sentences: (chunk, position, text)
+        for c, chunk in enumerate(chunks):
+            for position, text in enumerate(_SENTENCE_BOUNDARY.split(chunk)):
+                text = text.strip()
+                key = _SPACES.sub(" ", text).lower()
+                if key in seen:
+                    duplicates += 1
+                elif key:
+                    seen.add(key)
+                    sentences.append((c, position, text))
+        if not sentences or budget <= 0:
+            return ""
+
+        # Sentences are only cached in memory: writing one disk file per sentence on every query
+        # would churn the disk tier that holds the (reusable) chunk embeddings
+        vectors = embedder.get_embeddings([text for _, _, text in sentences], disk_cache=False)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        query = question_embedding / max(float(np.linalg.norm(question_embedding)), 1e-12)
+        scores = vectors @ query
+
+        separator_tokens = count_tokens(separator)
+        used, packed, over_budget = 0, [], 0
+        for i in np.argsort(-scores, kind="stable"):
+            if packed and float(np.max(vectors[packed] @ vectors[i])) >= duplicate_similarity:
+                duplicates += 1
+                continue
+            cost = count_tokens(sentences[i][2]) + separator_tokens
+            if used + cost > budget:
+                over_budget += 1
+                continue
+            used += cost
+            packed.append(i)
+
+        metrics.inc("docqa_context_sentences_total", len(packed), outcome="packed")
+        metrics.inc("docqa_context_sentences_total", duplicates, outcome="duplicate")
+        metrics.inc("docqa_context_sentences_total", over_budget, outcome="over_budget")
+        metrics.observe("docqa_context_tokens", used)
+
+        groups = {}
+        for i in sorted(packed, key=lambda i: sentences[i][:2]):
+            groups.setdefault(sentences[i][0], []).append(sentences[i][2])
+        return separator.join(" ".join(group) for group in groups.values())
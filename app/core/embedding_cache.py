@@ -0,0 +1,102 @@
+# File: app/core/embedding_cache.py
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from app.core.file_store import FileLRU
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of chunk embeddings, keyed by a hash of model name and text.
+
+    Lookups go to an in-memory LRU first and then to an optional on-disk tier of one .npy
+    file per embedding (a FileLRU, so bounded by total size).
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = None,
+                 max_memory_items: int = 50_000, max_disk_bytes: int = 512 * 1024 * 1024):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._disk = FileLRU(cache_dir, ".npy", max_disk_bytes, label="embedding cache") if cache_dir else None
+        self._lock = threading.Lock()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts, disk: bool = True):
+        """
+        Returns a list with the cached embedding of each text, or None where there is none.
+        With disk=False only the in-memory tier is consulted.
+        """
+        found = []
+        with self._lock:
+            for text in texts:
+                key = self.key(text)
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                elif disk and self._disk is not None and key in self._disk:
+                    embedding = self._read_disk(key)
+                    if embedding is not None:
+                        self._remember(key, embedding)
+                        self.disk_hits += 1
+                    else:
+                        self.misses += 1
+                else:
+                    self.misses += 1
+                found.append(embedding)
+        return found
+
+    def put_many(self, texts, embeddings: np.ndarray, disk: bool = True):
+        """Stores one embedding per text in both tiers (only in memory with disk=False)."""
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.key(text)
+                embedding = np.array(embedding, dtype=np.float32)
+                self._remember(key, embedding)
+                if disk and self._disk is not None and key not in self._disk:
+                    buffer = io.BytesIO()
+                    np.save(buffer, embedding)
+                    self._disk.put(key, buffer.getvalue())
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str):
+        data = self._disk.get(key)
+        if data is None:
+            return None
+        try:
+            return np.load(io.BytesIO(data))
+        except ValueError as e:
+            print(f"Warning: Dropping corrupt embedding cache entry {key}: {e}")
+            self._disk.forget(key)
+            return None
+
+    @property
+    def stats(self):
+        """Hit/miss counters since the cache was created."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": len(self._disk) if self._disk is not None else 0,
+            "disk_bytes": self._disk.bytes if self._disk is not None else 0,
+        }
@@ -1,15 +1,150 @@
-from transformers import AutoTokenizer, AutoModel
-import torch
+import os
 import numpy as np
 
+from app.core import metrics
+
+# torch and transformers are imported where they are used, so that importing this module stays cheap
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
 class EmbeddingModel:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModel.from_pretrained(model_name)
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", batch_size: int = 32, cache=None,
+                 snapshot_dir: str = None, backend: str = "torch", onnx_dir: str = None, num_threads: int = None):
+        """
+        Loads the tokenizer and model.
+
+        With snapshot_dir, the model is loaded from a local snapshot of it saved there on an
+        earlier start (skipping Hugging Face hub resolution), and the snapshot is written after
+        the first load from the hub.
+
+        backend is "torch", "onnx" (the model exported to ONNX and run with ONNX Runtime) or
+        "onnx-int8" (the same export with dynamically int8-quantized weights). The export is
+        made once into onnx_dir (default: snapshot_dir, else models/onnx) and reused after
+        that without loading PyTorch. num_threads sets the intra-op threads of either backend.
+        """
+        from transformers import AutoTokenizer, AutoConfig
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.backend = backend
+        self.cache = cache # Optional EmbeddingCache consulted before running the model
+        self.model = None
+        self.onnx = None
+        snapshot = os.path.join(snapshot_dir, model_name.replace("/", "__")) if snapshot_dir else None
+        source = snapshot if snapshot and os.path.exists(os.path.join(snapshot, "config.json")) else model_name
+
+        if backend != "torch":
+            from app.core.onnx_encoder import ONNX_FILE, ONNX_INT8_FILE, OnnxEncoder, export_onnx, quantize_onnx
+            export_dir = os.path.join(onnx_dir or snapshot_dir or os.path.join("models", "onnx"),
+                                      model_name.replace("/", "__") + ".onnx")
+            if not os.path.exists(os.path.join(export_dir, ONNX_FILE)):
+                export_onnx(source, export_dir)
+            model_file = ONNX_FILE
+            if backend == "onnx-int8":
+                model_file = ONNX_INT8_FILE
+                if not os.path.exists(os.path.join(export_dir, model_file)):
+                    quantize_onnx(export_dir)
+            self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+            self.config = AutoConfig.from_pretrained(export_dir)
+            self.onnx = OnnxEncoder(os.path.join(export_dir, model_file), num_threads)
+            return
+
+        import torch
+        from transformers import AutoModel
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(source)
+        self.model = AutoModel.from_pretrained(source)
+        self.model.eval()
+        self.config = self.model.config
+        if snapshot and source != snapshot:
+            try:
+                self.tokenizer.save_pretrained(snapshot + ".tmp")
+                self.model.save_pretrained(snapshot + ".tmp")
+                os.replace(snapshot + ".tmp", snapshot) # Only complete snapshots are ever picked up
+                print(f"Saved embedding model snapshot to {snapshot}")
+            except OSError as e:
+                print(f"Warning: Could not save embedding model snapshot to {snapshot}: {e}")
+
+    def warm_up(self):
+        """Runs one tiny batch so the first real request does not pay for lazy initialization."""
+        self._embed(["warm up"], 1)
+        return self
+
+    @property
+    def dimension(self):
+        """Returns the size of the vectors produced by the model."""
+        return self.config.hidden_size
+
+    @property
+    def max_tokens(self):
+        """Longest input, in tokens excluding special tokens, that is embedded without truncation."""
+        limit = min(self.tokenizer.model_max_length, self.config.max_position_embeddings)
+        return limit - self.tokenizer.num_special_tokens_to_add()
 
     def get_embedding(self, text: str):
-        inputs = self.tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        embeddings = outputs.last_hidden_state.mean(dim=1)
-        return embeddings[0].cpu().numpy()
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts, batch_size: int = None, disk_cache: bool = True) -> np.ndarray:
+        """
+        Embeds many texts and returns an (N, dim) float32 matrix in input order.
+
+        Texts found in the cache (if any) are not re-embedded. The rest are sorted
+        by token length before batching so each batch is only padded up to its own
+        longest member, and the token vectors are mean-pooled with the attention
+        mask so padding does not dilute them. disk_cache=False keeps the texts out of the
+        cache's disk tier, for short-lived texts such as the sentences of retrieved chunks.
+        """
+        texts = list(texts)
+        with metrics.timer("embed"):
+            return self._get_embeddings(texts, batch_size or self.batch_size, disk_cache)
+
+    def _get_embeddings(self, texts, batch_size: int, disk_cache: bool = True) -> np.ndarray:
+        if self.cache is None:
+            metrics.inc("docqa_embedded_texts_total", len(texts), source="model")
+            return self._embed(texts, batch_size)
+
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        for i, cached in enumerate(self.cache.get_many(texts, disk=disk_cache)):
+            if cached is None:
+                missing.append(i)
+            else:
+                embeddings[i] = cached
+        metrics.inc("docqa_embedded_texts_total", len(texts) - len(missing), source="cache")
+        metrics.inc("docqa_embedded_texts_total", len(missing), source="model")
+        if missing:
+            computed = self._embed([texts[i] for i in missing], batch_size)
+            embeddings[missing] = computed
+            self.cache.put_many([texts[i] for i in missing], computed, disk=disk_cache)
+        return embeddings
+
+    def _embed(self, texts, batch_size: int) -> np.ndarray:
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return embeddings
+
+        encoded = self.tokenizer(texts, truncation=True)
+        order = np.argsort([len(ids) for ids in encoded["input_ids"]], kind="stable")
+        batches = [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+        if self.onnx is not None: # Mean pooling is part of the exported graph
+            for batch_idx in batches:
+                features = {key: [values[i] for i in batch_idx] for key, values in encoded.items()}
+                embeddings[batch_idx] = self.onnx.encode(self.tokenizer.pad(features, return_tensors="np"))
+            return embeddings
+
+        import torch
+        with torch.inference_mode():
+            for batch_idx in batches:
+                features = {key: [values[i] for i in batch_idx] for key, values in encoded.items()}
+                inputs = self.tokenizer.pad(features, return_tensors="pt")
+                outputs = self.model(**inputs)
+
+                mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+                summed = (outputs.last_hidden_state * mask).sum(dim=1)
+                counts = mask.sum(dim=1).clamp(min=1e-9)
+                embeddings[batch_idx] = (summed / counts).cpu().numpy()
+
+        return embeddings
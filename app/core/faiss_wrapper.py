@@ -1,19 +1,187 @@
 # File: app/core/faiss_wrapper.py
 
+import bisect
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
 import faiss
 import numpy as np
 import traceback # Optional: for more detailed error logging if needed
 
+from app.core import metrics
+from app.core.chunk_store import ChunkStore
+
+MANIFEST_FILE = "index.json"  # Written last on save; records how many rows are committed
+VECTORS_FILE = "vectors.f32"  # Raw float32 rows, appended on each save
+INDEX_FILE = "index.faiss"    # Serialized ANN index of stores saved before index files were named in the manifest
+LOCK_FILE = "store.lock"      # Locked (flock) by the one FaissIndex that has the store open
+
+INDEX_TYPES = ("auto", "flat", "ivf_flat", "ivf_pq", "hnsw")
+FLAT_MAX_VECTORS = 50_000         # "auto" uses exact search up to this many vectors
+IVF_FLAT_MAX_VECTORS = 2_000_000  # ... then IVF-Flat, then IVF-PQ (re-ranked, see RERANK_FACTOR) above this
+MIN_TRAIN_VECTORS = {"ivf_flat": 1_000, "ivf_pq": 10_000}  # Stay flat until IVF can be trained
+RETRAIN_GROWTH = 4.0              # Retrain IVF indexes once they grow by this factor
+MAX_TRAIN_SAMPLE = 200_000
+RERANK_FACTOR = 8                 # IVF-PQ searches re-rank this many times k candidates with exact distances ...
+RERANK_MIN_CANDIDATES = 80        # ... and at least this many
+ADD_BATCH_ROWS = 65_536
+COMPACT_DEAD_RATIO = 1.0          # Rebuild without removed chunks once they outnumber the live ones
+BACKGROUND_REBUILD_MIN_VECTORS = 20_000 # Rebuilds over this many vectors run on a thread while searches use the old index
+VECTOR_CODECS = ("fp32", "fp16", "int8")  # How the index stores vectors; fp16/int8 are FAISS scalar quantizers
+SQ_RANGE_MARGIN = 0.2             # int8 codes span each dimension's trained range widened by this much on both sides
+MIN_INT8_TRAIN_VECTORS = 1_000    # int8 indexes store fp16 codes until their ranges can be fit on this many vectors
+_SQ_TYPES = {"fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def choose_index_type(num_vectors: int) -> str:
+    """Picks the index type "auto" mode uses for a corpus of the given size."""
+    if num_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors <= IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def build_index(index_type: str, dim: int, num_vectors: int, codec: str = "fp32"):
+    """
+    Creates an empty (untrained) CPU index of the given type, sized for num_vectors.
+    IVF indexes use about 4*sqrt(N) lists; IVF-PQ uses 8-bit codes for sub-vectors of ~8 dims.
+    With an fp16 or int8 codec, flat, IVF-Flat and HNSW indexes store scalar-quantized vectors
+    (2 or 1 bytes per dimension instead of 4); IVF-PQ codes are compact already.
+    """
+    if codec not in VECTOR_CODECS:
+        raise ValueError(f"Unknown vector codec '{codec}'. Expected one of {VECTOR_CODECS}.")
+    qtype = _SQ_TYPES.get(codec)
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim) if qtype is None else _widened(faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2))
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, 32) if qtype is None else faiss.IndexHNSWSQ(dim, qtype, 32)
+        if qtype is not None:
+            _widened(faiss.downcast_index(index.storage))
+        index.hnsw.efConstruction = 80
+        return index
+
+    nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        if qtype is not None:
+            return _widened(faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype))
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+    if index_type == "ivf_pq":
+        m = next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8)
+    raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+
+def _widened(index):
+    """Makes an int8 scalar quantizer train on the min/max range plus SQ_RANGE_MARGIN, so later vectors rarely clip."""
+    index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+    index.sq.rangestat_arg = SQ_RANGE_MARGIN
+    return index
+
+
+def _id_mapped(index):
+    """
+    IVF indexes store ids natively; other types are wrapped so rows keep their chunk ids.
+    IndexIDMap rather than IndexIDMap2: vectors are never reconstructed, and the reverse
+    id -> row hash map of IDMap2 would cost more memory per chunk than an int8 vector.
+    """
+    return index if isinstance(index, faiss.IndexIVF) else faiss.IndexIDMap(index)
+
+
+def _train_sample(read_rows, live_ids: np.ndarray) -> np.ndarray:
+    """Up to MAX_TRAIN_SAMPLE evenly spaced live rows, read with read_rows(ids), as contiguous float32."""
+    rows = live_ids[np.linspace(0, len(live_ids) - 1, min(len(live_ids), MAX_TRAIN_SAMPLE)).astype(np.int64)]
+    return np.ascontiguousarray(read_rows(rows), dtype=np.float32)
+
+
+def _lock_store(store_dir: str):
+    """
+    Takes the exclusive lock of a store directory, or raises RuntimeError if another FaissIndex
+    (in any process) holds it: each save() truncates the files to its own row count, so two
+    writers would silently overwrite each other's rows.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    lock = open(os.path.join(store_dir, LOCK_FILE), "a+")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock.seek(0)
+        holder = lock.read().strip() or "unknown"
+        lock.close()
+        raise RuntimeError(f"Vector store {store_dir} is already open (pid {holder}). Stop the process using it "
+                           f"(e.g. main.py or ui.py) first, or serve the index from shard servers.")
+    lock.truncate(0)
+    lock.write(str(os.getpid()))
+    lock.flush()
+    return lock
+
+
+def _merge_range(ranges, start: int, stop: int):
+    """Appends [start, stop) to a list of ranges, extending the last one when they touch."""
+    if ranges and ranges[-1][1] == start:
+        ranges[-1][1] = stop
+    else:
+        ranges.append([start, stop])
+
 # Ensures no self-import or incorrect module-level instantiation occurs here
 
 class FaissIndex:
-    def __init__(self, dim: int):
-        """Initializes the Faiss index."""
+    def __init__(self, dim: int, store_dir: str = None, index_type: str = "auto",
+                 nprobe: int = 16, ef_search: int = 64, vector_codec: str = "fp32", compress_text: bool = False):
+        """
+        Initializes the Faiss index.
+
+        Every chunk gets a stable id (its position in text_chunks). Chunks can belong to a
+        document registered with new_document(); removing a document tombstones its ids, and
+        searches skip tombstoned or unselected ids through a FAISS IDSelector.
+
+        Args:
+            dim: Embedding dimension.
+            store_dir: Optional directory that save() persists the index to.
+            index_type: One of INDEX_TYPES. "auto" switches from exact search to IVF-Flat and
+                then IVF-PQ as the corpus grows (see choose_index_type).
+            nprobe: Default number of IVF lists visited per query.
+            ef_search: Default HNSW search depth.
+            vector_codec: One of VECTOR_CODECS. "fp16" halves and "int8" quarters the memory of
+                stored vectors, at a small cost in recall; int8 ranges are refit as the index grows,
+                and smaller int8 indexes use fp16 until MIN_INT8_TRAIN_VECTORS.
+                The raw float32 vectors are still kept (in memory until save()) for rebuilds.
+            compress_text: Store chunk texts as zlib-compressed blocks (see ChunkStore).
+        """
         if not isinstance(dim, int) or dim <= 0:
             raise ValueError(f"Dimension 'dim' must be a positive integer, got {dim}")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Expected one of {INDEX_TYPES}.")
         try:
-            self.index = faiss.IndexFlatL2(dim)
-            self.text_chunks = []
+            self.vector_codec = vector_codec
+            self.active_codec = self._codec_for(0) # Codec of self.index
+            self.index = _id_mapped(build_index("flat", dim, 0, self.active_codec))
+            self.index_type = index_type
+            self.active_type = "flat" # Type of self.index; trained types take over once there is enough data
+            self.nprobe = nprobe
+            self.ef_search = ef_search
+            self.store_dir = store_dir
+            self._store_lock = _lock_store(store_dir) if store_dir else None # Released when the index is freed
+            self.text_chunks = ChunkStore(store_dir, compress=compress_text)
+            self._persisted_count = 0 # Rows already written to store_dir
+            self._store_reset = False # reset() since the last save; the stored rows are to be dropped
+            self._trained_size = 0 # Index size at the last (re)build
+            self._unsaved_vectors = [] # Raw float32 rows not yet in store_dir
+            self._index_dirty = False # Whether INDEX_FILE is out of date
+            self._index_mmapped = False # IVF lists loaded read-only from _index_file
+            self._index_file = None # Saved index file named by the manifest; None for flat indexes
+            self._pending_rebuild = None # Background rebuild in progress (see _rebuild)
+            self.documents = {} # doc_id -> metadata (filename, tenant, uploaded_at, chunks, ...)
+            self._doc_ranges = {} # doc_id -> [[start, stop), ...] chunk id ranges
+            self._deleted = [] # [[start, stop), ...] chunk id ranges of removed documents
+            self._deleted_count = 0
+            self._live_bitmap = None # Cached packed bitmap of live ids; None when stale
+            self._range_index = None # Cached sorted (start, stop, doc_id) ranges for document_of()
+            self.version = 0 # Bumped whenever the searchable contents change; caches of answers key on it
             self._dimension = dim # Store dimension if needed later
             print(f"Initialized FaissIndex with dimension {dim}. Index is_trained: {self.index.is_trained}")
         except Exception as e:
@@ -47,8 +215,9 @@ class FaissIndex:
                  embedding = embedding.astype(np.float32)
 
             # Add to FAISS index and store text chunk
-            self.index.add(embedding)
+            self._add_vectors(embedding)
             self.text_chunks.append(chunk)
+            self._maybe_rebuild()
             # Optional: print(f"Added chunk. Index size: {self.index.ntotal}")
 
         except Exception as e:
@@ -59,8 +228,371 @@ class FaissIndex:
             # Decide if you want to re-raise or just log the error
             # raise
 
-    def search(self, query_vector: np.ndarray, top_k=3): # Default k added back
-        """Searches the index for the top_k nearest neighbors."""
+    @metrics.timed("index")
+    def add_batch(self, embeddings: np.ndarray, chunks, doc_id: str = None):
+        """
+        Adds an (N, dim) matrix of embeddings and their N text chunks in a single FAISS call.
+        The matrix is passed through without copying when it is already C-contiguous float32.
+        With doc_id (from new_document), the chunks are attributed to that document.
+        """
+        try:
+            if doc_id is not None and doc_id not in self.documents:
+                raise KeyError(f"Unknown document id '{doc_id}'.")
+            if not isinstance(embeddings, np.ndarray):
+                raise TypeError("Embeddings must be a numpy array.")
+            if embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+                raise ValueError(f"Embeddings shape ({embeddings.shape}) must be (N, {self.dimension}).")
+            if embeddings.shape[0] != len(chunks):
+                raise ValueError(f"Got {embeddings.shape[0]} embeddings but {len(chunks)} chunks.")
+
+            embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+            start = len(self.text_chunks)
+            self._add_vectors(embeddings)
+            self.text_chunks.extend(chunks)
+            if doc_id is not None and len(chunks):
+                _merge_range(self._doc_ranges[doc_id], start, start + len(chunks))
+                self.documents[doc_id]["chunks"] += len(chunks)
+                self._range_index = None
+            self._maybe_rebuild()
+
+        except Exception as e:
+            print(f"Error adding embedding batch: {e}")
+            print(traceback.format_exc())
+            raise
+
+    def _add_vectors(self, embeddings: np.ndarray):
+        self._ensure_writable()
+        start = len(self.text_chunks)
+        self.index.add_with_ids(embeddings, np.arange(start, start + len(embeddings), dtype=np.int64))
+        self._index_dirty = True
+        self._live_bitmap = None
+        self._unsaved_vectors.append(embeddings.copy())
+        self.version += 1
+
+    def new_document(self, filename: str = None, tenant: str = None, doc_id: str = None, **metadata) -> str:
+        """
+        Registers a document and returns its id; pass it to add_batch() for the document's chunks.
+        Extra keyword arguments are stored with the metadata.
+        """
+        doc_id = doc_id or uuid.uuid4().hex
+        if doc_id in self.documents:
+            raise ValueError(f"Document id '{doc_id}' already exists.")
+        self.documents[doc_id] = {"doc_id": doc_id, "filename": filename, "tenant": tenant,
+                                  "uploaded_at": time.time(), "chunks": 0, **metadata}
+        self._doc_ranges[doc_id] = []
+        return doc_id
+
+    def list_documents(self, tenant: str = None, filename: str = None):
+        """Metadata of the indexed documents, optionally only those of a tenant and/or filename."""
+        return [dict(meta) for meta in self.documents.values()
+                if (tenant is None or meta["tenant"] == tenant) and (filename is None or meta["filename"] == filename)]
+
+    @metrics.timed("remove_document")
+    def remove_document(self, doc_id: str) -> int:
+        """
+        Removes a document in O(its chunks): its ids are tombstoned and excluded from every later
+        search, without touching the rest of the index. Space is reclaimed when the index is
+        next rebuilt, which happens early once removed chunks outnumber live ones.
+
+        Returns:
+            The number of chunks removed.
+        """
+        if doc_id not in self.documents:
+            raise KeyError(f"Unknown document id '{doc_id}'.")
+        ranges = self._doc_ranges.pop(doc_id)
+        meta = self.documents.pop(doc_id)
+        for start, stop in ranges:
+            self._deleted.append([start, stop])
+            self._deleted_count += stop - start
+        self._live_bitmap = None
+        self._range_index = None
+        self.version += 1
+        print(f"Removed document {meta['filename'] or doc_id} ({meta['chunks']} chunks) from FaissIndex.")
+        if self._deleted_count and self._dead_in_index() > COMPACT_DEAD_RATIO * self.live_count:
+            self._start_rebuild(self._target_type())
+        return meta["chunks"]
+
+    def export_document(self, doc_id: str):
+        """
+        Returns (metadata, embeddings, chunks) of a document: its float32 vectors as stored before
+        quantization and its chunk texts, in chunk id order. Used to move documents between indexes.
+        """
+        if doc_id not in self.documents:
+            raise KeyError(f"Unknown document id '{doc_id}'.")
+        ranges = self._doc_ranges[doc_id]
+        ids = np.concatenate([np.arange(start, stop) for start, stop in ranges]) if ranges else np.empty(0, dtype=np.int64)
+        return dict(self.documents[doc_id]), self._raw_rows(ids), [self.text_chunks[int(i)] for i in ids]
+
+    def export_unattributed(self):
+        """Returns (embeddings, chunks) of the live chunks that belong to no document, as export_document() does."""
+        mask = self._live_mask()
+        for ranges in self._doc_ranges.values():
+            for start, stop in ranges:
+                mask[start:stop] = False
+        ids = np.flatnonzero(mask)
+        return self._raw_rows(ids), [self.text_chunks[int(i)] for i in ids]
+
+    def document_of(self, chunk_id: int):
+        """Metadata of the document a chunk id belongs to, or None."""
+        if self._range_index is None:
+            self._range_index = sorted((start, stop, doc_id) for doc_id, ranges in self._doc_ranges.items()
+                                       for start, stop in ranges)
+        i = bisect.bisect_right(self._range_index, (chunk_id, float("inf"))) - 1
+        if i >= 0 and chunk_id < self._range_index[i][1]:
+            return dict(self.documents[self._range_index[i][2]])
+        return None
+
+    @property
+    def live_count(self) -> int:
+        """Number of chunks that have not been removed."""
+        return len(self.text_chunks) - self._deleted_count
+
+    def _dead_in_index(self) -> int:
+        """Tombstoned ids still held by the FAISS index."""
+        return self.index.ntotal - self.live_count
+
+    def _live_mask(self) -> np.ndarray:
+        mask = np.ones(len(self.text_chunks), dtype=bool)
+        for start, stop in self._deleted:
+            mask[start:stop] = False
+        return mask
+
+    def _selector(self, doc_ids=None):
+        """
+        IDSelector restricting a search to live chunks of doc_ids (all documents when None),
+        or None when nothing needs excluding.
+        """
+        if doc_ids is None:
+            if self._dead_in_index() == 0:
+                return None
+            if self._live_bitmap is None:
+                self._live_bitmap = np.packbits(self._live_mask(), bitorder="little")
+            bitmap = self._live_bitmap
+        else:
+            ranges = [r for doc_id in doc_ids for r in self._doc_ranges.get(doc_id, ())]
+            if len(ranges) == 1:
+                return faiss.IDSelectorRange(*ranges[0])
+            mask = np.zeros(len(self.text_chunks), dtype=bool)
+            for start, stop in ranges:
+                mask[start:stop] = True
+            bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(bitmap)
+        selector.bitmap_array = bitmap # Keep the buffer alive as long as the selector
+        return selector
+
+    def _target_type(self) -> str:
+        """The index type the current corpus size calls for."""
+        ntotal = self.live_count
+        target = choose_index_type(ntotal) if self.index_type == "auto" else self.index_type
+        if ntotal < MIN_TRAIN_VECTORS.get(target, 0):
+            return "flat"
+        return target
+
+    def _maybe_rebuild(self):
+        """Switches index type, or retrains an IVF index that has outgrown its lists."""
+        self._finish_rebuild()
+        target = self._target_type()
+        if target != self.active_type or self._codec_for(self.live_count) != self.active_codec:
+            self._start_rebuild(target)
+        elif self._is_trained_type(target) and self.live_count >= RETRAIN_GROWTH * self._trained_size:
+            self._start_rebuild(target)
+
+    def _is_trained_type(self, index_type: str) -> bool:
+        """Whether an index of index_type learns from the data (and so is retrained as it grows)."""
+        return index_type in MIN_TRAIN_VECTORS or (self.active_codec == "int8" and index_type != "ivf_pq")
+
+    def _codec_for(self, num_vectors: int) -> str:
+        """
+        The codec an index over num_vectors uses: int8 ranges fit on a few vectors would be too
+        narrow (a single vector gives zero-width ranges), so small int8 indexes use fp16.
+        """
+        if self.vector_codec == "int8" and num_vectors < MIN_INT8_TRAIN_VECTORS:
+            return "fp16"
+        return self.vector_codec
+
+    def _row_reader(self):
+        """
+        Returns read_rows(ids), which gives the raw float32 vectors of chunk ids added so far without
+        materializing the whole store. It stays valid while rows are added or saved, but not after reset().
+        """
+        if len(self._unsaved_vectors) > 1: # Merged once, so repeated lookups do not copy every time
+            self._unsaved_vectors = [np.concatenate(self._unsaved_vectors)]
+        persisted_count = self._persisted_count
+        unsaved = self._unsaved_vectors[0] if self._unsaved_vectors else None # Never modified in place
+        vectors = np.memmap(os.path.join(self.store_dir, VECTORS_FILE), dtype=np.float32, mode="r",
+                            shape=(persisted_count, self.dimension)) if persisted_count else None
+
+        def read_rows(ids: np.ndarray) -> np.ndarray:
+            rows = np.empty((len(ids), self.dimension), dtype=np.float32)
+            persisted = ids < persisted_count
+            if persisted.any():
+                rows[persisted] = vectors[ids[persisted]]
+            if not persisted.all():
+                rows[~persisted] = unsaved[ids[~persisted] - persisted_count]
+            return rows
+        return read_rows
+
+    def _raw_rows(self, ids: np.ndarray) -> np.ndarray:
+        """Raw float32 vectors of the given chunk ids, read without materializing the whole store."""
+        return self._row_reader()(ids)
+
+    def _build(self, index_type: str, live_ids: np.ndarray, read_rows):
+        """Builds and trains an index of index_type over live_ids, reading at most ADD_BATCH_ROWS rows at a time."""
+        codec = self._codec_for(len(live_ids))
+        index = _id_mapped(build_index(index_type, self.dimension, len(live_ids), codec))
+        if not index.is_trained and len(live_ids):
+            index.train(_train_sample(read_rows, live_ids))
+        for start in range(0, len(live_ids), ADD_BATCH_ROWS):
+            ids = live_ids[start:start + ADD_BATCH_ROWS]
+            index.add_with_ids(read_rows(ids), ids.astype(np.int64))
+        return index, codec
+
+    def _rebuild(self, index_type: str, background: bool = False):
+        """
+        Builds and trains a fresh index of index_type from the raw vectors of live chunks. With
+        background=True it is built on a thread while searches keep using the current index, and
+        the first write after it is done installs it (see _finish_rebuild).
+        """
+        live_ids = np.flatnonzero(self._live_mask())
+        read_rows = self._row_reader()
+        print(f"Rebuilding FaissIndex as '{index_type}' over {len(live_ids)} vectors"
+              f"{' in the background' if background else ''}...")
+        if not background:
+            self._install(index_type, *self._build(index_type, live_ids, read_rows), len(live_ids))
+            return
+        pending = {"index_type": index_type, "count": len(self.text_chunks), "trained_size": len(live_ids)}
+
+        def build():
+            try:
+                pending["result"] = self._build(index_type, live_ids, read_rows)
+            except Exception as e:
+                print(f"Error rebuilding FaissIndex as '{index_type}': {e}")
+                print(traceback.format_exc())
+        pending["thread"] = threading.Thread(target=build, daemon=True, name="faiss-rebuild")
+        pending["thread"].start()
+        self._pending_rebuild = pending
+
+    def _start_rebuild(self, index_type: str):
+        """Rebuilds as index_type, in the background for large indexes; one background rebuild at a time."""
+        if self._pending_rebuild is None:
+            self._rebuild(index_type, background=self.live_count >= BACKGROUND_REBUILD_MIN_VECTORS)
+
+    def _finish_rebuild(self, wait: bool = False):
+        """
+        Installs a finished background rebuild, first adding the rows written since it started.
+        A failed one is dropped, and the next write that calls for it starts it again.
+        """
+        pending = self._pending_rebuild
+        if pending is None or (pending["thread"].is_alive() and not wait):
+            return
+        pending["thread"].join()
+        self._pending_rebuild = None
+        if "result" not in pending:
+            return
+        index, codec = pending["result"]
+        new_ids = np.arange(pending["count"], len(self.text_chunks))
+        new_ids = new_ids[self._live_mask()[new_ids]]
+        for start in range(0, len(new_ids), ADD_BATCH_ROWS):
+            ids = new_ids[start:start + ADD_BATCH_ROWS]
+            index.add_with_ids(self._raw_rows(ids), ids.astype(np.int64))
+        self._install(pending["index_type"], index, codec, pending["trained_size"])
+
+    def wait_for_rebuild(self):
+        """Blocks until a background rebuild (if any) is done and installs it; e.g. before a final save()."""
+        self._finish_rebuild(wait=True)
+
+    def _install(self, index_type: str, index, codec: str, trained_size: int):
+        self.index = index
+        self.active_type = index_type
+        self.active_codec = codec
+        self._trained_size = trained_size
+        self._index_dirty = True
+        self._index_mmapped = False
+        self._live_bitmap = None
+        print(f"FaissIndex rebuilt as '{index_type}'. Index size: {self.index.ntotal}")
+
+    def _ensure_writable(self):
+        """Replaces read-only memory-mapped IVF lists with an in-memory copy before the first write."""
+        if self._index_mmapped:
+            self.index = faiss.read_index(os.path.join(self.store_dir, self._index_file))
+            self._index_mmapped = False
+
+    def _search_params(self, nprobe: int = None, ef_search: int = None, doc_ids=None):
+        """Per-query search parameters (including the id filter) for the active index type."""
+        selector = self._selector(doc_ids)
+        if self.active_type in MIN_TRAIN_VECTORS:
+            params = faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        elif self.active_type == "hnsw":
+            params = faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        elif selector is None:
+            return None
+        else:
+            params = faiss.SearchParameters()
+        if selector is not None:
+            params.sel = selector
+            params.selector_ref = selector # SWIG does not keep the selector alive
+        return params
+
+    def _search(self, query_vectors: np.ndarray, k: int, params):
+        """
+        Searches the FAISS index. IVF-PQ codes alone cap recall@10 near 0.5, so for IVF-PQ the top
+        k * RERANK_FACTOR candidates (at least RERANK_MIN_CANDIDATES) are re-ranked by exact
+        distance to their raw float32 rows.
+        """
+        if self.active_type != "ivf_pq":
+            return self.index.search(query_vectors, k, params=params)
+        _, candidates = self.index.search(query_vectors, max(k * RERANK_FACTOR, RERANK_MIN_CANDIDATES), params=params)
+        distances = np.full((len(query_vectors), k), np.finfo(np.float32).max, dtype=np.float32)
+        ids = np.full((len(query_vectors), k), -1, dtype=np.int64)
+        for q, row in enumerate(candidates):
+            row = row[row >= 0]
+            exact = ((self._raw_rows(row) - query_vectors[q]) ** 2).sum(axis=1)
+            order = np.argsort(exact)[:k]
+            distances[q, :len(order)] = exact[order]
+            ids[q, :len(order)] = row[order]
+        return distances, ids
+
+    @metrics.timed("search")
+    def search_batch(self, query_vectors: np.ndarray, top_k=3, nprobe: int = None, ef_search: int = None,
+                     doc_ids=None):
+        """
+        Searches the index for the top_k nearest neighbors of each row in an (Q, dim) matrix.
+        nprobe / ef_search override the index defaults for IVF / HNSW indexes. doc_ids restricts
+        the search to chunks of those documents; the filter is applied inside FAISS.
+
+        Returns:
+            A tuple (distances, ids, results): (Q, k) arrays of squared L2 distances and chunk ids,
+            and a list of Q lists of text chunks. Ids of -1 (fewer than k matches) are left out of results.
+        """
+        try:
+            if not isinstance(query_vectors, np.ndarray):
+                raise TypeError("Query vectors must be a numpy array.")
+            if query_vectors.ndim != 2 or query_vectors.shape[1] != self.dimension:
+                raise ValueError(f"Query vectors shape ({query_vectors.shape}) must be (Q, {self.dimension}).")
+
+            actual_k = min(top_k, self.index.ntotal)
+            if actual_k <= 0:
+                num_queries = query_vectors.shape[0]
+                return (np.empty((num_queries, 0), dtype=np.float32),
+                        np.empty((num_queries, 0), dtype=np.int64),
+                        [[] for _ in range(num_queries)])
+
+            query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+            distances, ids = self._search(query_vectors, actual_k, self._search_params(nprobe, ef_search, doc_ids))
+            results = [[self.text_chunks[i] for i in row if i >= 0] for row in ids]
+            return distances, ids, results
+
+        except Exception as e:
+            print(f"Error during batch search: {e}")
+            print(traceback.format_exc())
+            raise
+
+    @metrics.timed("search")
+    def search(self, query_vector: np.ndarray, top_k=3, nprobe: int = None, ef_search: int = None, doc_ids=None): # Default k added back
+        """
+        Searches the index for the top_k nearest neighbors. nprobe / ef_search tune IVF / HNSW indexes.
+        doc_ids restricts the search to chunks of those documents.
+        """
         try:
             # Check if index is ready/populated before searching
             if not self.is_ready():
@@ -89,7 +621,7 @@ class FaissIndex:
                  return []
 
             # Perform the search
-            distances, indices = self.index.search(query_vector, actual_k)
+            distances, indices = self._search(query_vector, actual_k, self._search_params(nprobe, ef_search, doc_ids))
 
             # Retrieve the corresponding text chunks
             results = [self.text_chunks[i] for i in indices[0] if 0 <= i < len(self.text_chunks)]
@@ -108,29 +640,172 @@ class FaissIndex:
         Resets the index, removing all stored vectors and text chunks.
         """
         try:
-            current_size = self.index.ntotal
-            self.index.reset()
-            self.text_chunks = []
+            current_size = self.live_count
+            if self._pending_rebuild is not None: # It may still read the files the next save() truncates
+                self._pending_rebuild["thread"].join()
+                self._pending_rebuild = None
+            self.active_codec = self._codec_for(0)
+            self.index = _id_mapped(build_index("flat", self.dimension, 0, self.active_codec))
+            self.active_type = "flat"
+            self.text_chunks.close()
+            self.text_chunks = ChunkStore(self.store_dir, compress=self.text_chunks.compress)
+            self._persisted_count = 0 # Next save() truncates the store
+            self._store_reset = self.store_dir is not None
+            self._trained_size = 0
+            self._unsaved_vectors = []
+            self._index_dirty = True
+            self._index_mmapped = False
+            self.documents = {}
+            self._doc_ranges = {}
+            self._deleted = []
+            self._deleted_count = 0
+            self._live_bitmap = None
+            self._range_index = None
+            self.version += 1
             print(f"FaissIndex reset. Removed {current_size} items. Index size is now: {self.index.ntotal}")
         except Exception as e:
             print(f"Error resetting index: {e}")
             print(traceback.format_exc())
 
+    @metrics.timed("save")
+    def save(self):
+        """
+        Persists rows added since the last save to store_dir.
+
+        Vectors and chunk texts are appended to their files; existing rows are never rewritten.
+        Trained (non-flat) indexes are also serialized, since FAISS cannot append to a saved index;
+        each save that changed one writes it to a new index-<id>.faiss file. The manifest, which
+        names that file and holds the document registry and removed id ranges, is replaced
+        atomically at the end, so an interrupted save leaves the previous state (and index file)
+        loadable. Index files the manifest no longer names are deleted after it is replaced.
+        After reset(), an empty manifest is written before the files are truncated, so an
+        interruption then leaves an empty (but loadable) store. A finished background rebuild is
+        installed first; one still running is not waited for (see wait_for_rebuild).
+        """
+        if self.store_dir is None:
+            raise ValueError("FaissIndex has no store_dir to save to.")
+        try:
+            self._finish_rebuild()
+            os.makedirs(self.store_dir, exist_ok=True)
+            total = len(self.text_chunks)
+            new_rows = total - self._persisted_count
+            if self._store_reset: # The manifest on disk still counts rows that are about to be truncated
+                self._write_manifest(0, {}, [])
+                self._store_reset = False
+            with open(os.path.join(self.store_dir, VECTORS_FILE), "ab") as f:
+                f.truncate(self._persisted_count * self.dimension * 4)
+                for vectors in self._unsaved_vectors:
+                    f.write(vectors.tobytes())
+            self.text_chunks.flush()
+
+            index_file = None if self.active_type == "flat" else self._index_file
+            if self.active_type != "flat" and (self._index_dirty or index_file is None):
+                index_file = f"index-{uuid.uuid4().hex}.faiss"
+                index_path = os.path.join(self.store_dir, index_file)
+                faiss.write_index(self.index, index_path + ".tmp")
+                os.replace(index_path + ".tmp", index_path)
+
+            self._write_manifest(total, {doc_id: {**meta, "ranges": self._doc_ranges[doc_id]}
+                                         for doc_id, meta in self.documents.items()}, self._deleted, index_file)
+            self._index_file = index_file
+            for name in os.listdir(self.store_dir): # Replaced, or written by an interrupted save
+                if name.startswith("index") and name.endswith((".faiss", ".faiss.tmp")) and name != index_file:
+                    os.remove(os.path.join(self.store_dir, name))
+            self._persisted_count = total
+            self._unsaved_vectors = []
+            self._index_dirty = False
+            print(f"FaissIndex saved {new_rows} new items to {self.store_dir}. Stored size: {total}")
+        except Exception as e:
+            print(f"Error saving index to {self.store_dir}: {e}")
+            print(traceback.format_exc())
+            raise
+
+    def _write_manifest(self, count: int, documents, deleted, index_file: str = None):
+        """Atomically replaces the manifest, which commits the first `count` stored rows (and index_file)."""
+        manifest_path = os.path.join(self.store_dir, MANIFEST_FILE)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({"dimension": self.dimension, "count": count, "index_type": self.index_type,
+                       "active_type": self.active_type if count else "flat", "trained_size": self._trained_size,
+                       "vector_codec": self.vector_codec, "active_codec": self.active_codec,
+                       "compress_text": self.text_chunks.compress, "index_file": index_file,
+                       "documents": documents, "deleted": deleted}, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    @classmethod
+    def load(cls, store_dir: str):
+        """
+        Loads an index saved by save(). Flat vectors are read through a memory map straight into
+        FAISS, trained indexes are opened with their IVF lists memory-mapped until the first write,
+        and chunk texts stay memory-mapped, so none of it is copied into Python objects.
+        Stores saved before document tracking load with all chunks unattributed.
+        """
+        with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        dim, count = manifest["dimension"], manifest["count"]
+
+        instance = cls(dim, store_dir=store_dir, index_type=manifest.get("index_type", "auto"),
+                       vector_codec=manifest.get("vector_codec", "fp32"), compress_text=manifest.get("compress_text", False))
+        for doc_id, meta in manifest.get("documents", {}).items():
+            instance._doc_ranges[doc_id] = meta.pop("ranges")
+            instance.documents[doc_id] = meta
+        instance._deleted = manifest.get("deleted", [])
+        instance._deleted_count = sum(stop - start for start, stop in instance._deleted)
+        active_type = manifest.get("active_type", "flat")
+        if active_type != "flat":
+            instance._index_file = manifest.get("index_file") or INDEX_FILE
+            instance.index = faiss.read_index(os.path.join(store_dir, instance._index_file), faiss.IO_FLAG_MMAP)
+            instance.active_type = active_type
+            instance.active_codec = manifest.get("active_codec", instance.vector_codec)
+            instance._trained_size = manifest.get("trained_size", count)
+            instance._index_mmapped = active_type in MIN_TRAIN_VECTORS
+        instance.text_chunks = ChunkStore.open(store_dir, count, compress=instance.text_chunks.compress)
+        if active_type == "flat" and count > 0:
+            vectors = np.memmap(os.path.join(store_dir, VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, dim))
+            live_ids = np.flatnonzero(instance._live_mask())
+            instance.active_codec = instance._codec_for(len(live_ids))
+            instance.index = _id_mapped(build_index("flat", dim, 0, instance.active_codec))
+            if not instance.index.is_trained:
+                instance.index.train(_train_sample(lambda ids: vectors[ids], live_ids))
+                instance._trained_size = len(live_ids)
+            for start in range(0, len(live_ids), ADD_BATCH_ROWS):
+                ids = live_ids[start:start + ADD_BATCH_ROWS]
+                instance.index.add_with_ids(np.ascontiguousarray(vectors[ids]), ids.astype(np.int64))
+            del vectors
+        instance._persisted_count = count
+        if not isinstance(instance.index, (faiss.IndexIVF, faiss.IndexIDMap)):
+            instance._rebuild(active_type) # Stores saved before chunk ids were tracked
+        print(f"Loaded FaissIndex with {count} items from {store_dir}.")
+        return instance
+
+    @classmethod
+    def open(cls, store_dir: str, dim: int, index_type: str = "auto", vector_codec: str = "fp32",
+             compress_text: bool = False):
+        """
+        Loads the index saved in store_dir, or creates an empty one bound to it. The index type,
+        vector codec and text compression only apply to a new store; a saved one keeps its own.
+        """
+        if os.path.exists(os.path.join(store_dir, MANIFEST_FILE)):
+            instance = cls.load(store_dir)
+            if instance.dimension != dim:
+                raise ValueError(f"Stored index dimension ({instance.dimension}) does not match requested dimension ({dim}).")
+            return instance
+        return cls(dim, store_dir=store_dir, index_type=index_type, vector_codec=vector_codec, compress_text=compress_text)
+
     def is_ready(self):
         """
         Checks if the index contains any vectors (i.e., is populated and ready for search).
         """
         try:
-            return self.index.ntotal > 0
+            return self.live_count > 0
         except Exception as e:
             print(f"Error checking index readiness: {e}")
             print(traceback.format_exc())
             return False # Assume not ready if check fails
 
     def __len__(self):
-        """Returns the number of items currently in the index."""
+        """Returns the number of items currently in the index (removed documents excluded)."""
         try:
-            return self.index.ntotal
+            return self.live_count
         except Exception as e:
             print(f"Error getting index length: {e}")
             print(traceback.format_exc())
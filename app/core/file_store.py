@@ -0,0 +1,112 @@
+# File: app/core/file_store.py
+
+import os
+import threading
+
+class FileLRU:
+    """
+    Size-bounded directory of one file per key (key + suffix), used as the disk tier of the
+    embedding and audio caches. When the files outgrow max_bytes, least recently used ones are
+    removed until they are back under 90% of it; file mtimes are bumped on every hit, so the
+    order survives restarts. Files are written via a .tmp file, and .tmp files left by a crash
+    mid-write are removed when the store is opened.
+    """
+
+    def __init__(self, cache_dir: str, suffix: str, max_bytes: int, label: str = "cache"):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.label = label # Names the store in warnings
+        self.hits = 0
+        self.misses = 0
+        self._files = {} # key -> (last use, size in bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        for entry in os.scandir(cache_dir):
+            if entry.name.endswith(suffix):
+                stat = entry.stat()
+                self._files[entry.name[:-len(suffix)]] = (stat.st_mtime, stat.st_size)
+                self._bytes += stat.st_size
+            elif entry.name.endswith(".tmp"):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        with self._lock:
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._files
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + self.suffix)
+
+    def get(self, key: str):
+        """Returns the contents of the file for key, or None."""
+        with self._lock:
+            if key in self._files:
+                path = self._path(key)
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    os.utime(path)
+                    self._files[key] = (os.path.getmtime(path), len(data))
+                    self.hits += 1
+                    return data
+                except OSError as e:
+                    print(f"Warning: Dropping unreadable {self.label} entry {path}: {e}")
+                    self._forget(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes):
+        """Writes the file for key (unless it exists), then evicts if the store is over budget."""
+        path = self._path(key)
+        with self._lock:
+            if key in self._files:
+                return
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+                self._files[key] = (os.path.getmtime(path), len(data))
+                self._bytes += len(data)
+            except OSError as e:
+                print(f"Warning: Could not write {self.label} entry {path}: {e}")
+            self._evict()
+
+    def forget(self, key: str):
+        """Removes the file for key, e.g. when its contents turn out to be corrupt."""
+        with self._lock:
+            self._forget(key)
+
+    def _forget(self, key: str):
+        _, size = self._files.pop(key, (0, 0))
+        self._bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        target = 0.9 * self.max_bytes
+        for key, _ in sorted(self._files.items(), key=lambda item: item[1][0]):
+            if self._bytes <= target:
+                break
+            self._forget(key)
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "files": len(self._files), "bytes": self._bytes}
@@ -0,0 +1,81 @@
+# File: app/core/lazy.py
+
+import threading
+import time
+import traceback
+
+class LazyModel:
+    """
+    Defers an expensive load (a model, a voice, ...) until it is first needed.
+
+    start() begins loading on a daemon thread so the process can serve requests meanwhile;
+    get() returns the loaded object, waiting for a background load in progress or loading
+    inline if none was started. Attribute access is forwarded to the loaded object, so a
+    LazyModel can stand in for the object itself. A failed load is re-raised on every get().
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = False
+        self._value = None
+        self._error = None
+        self.load_seconds = None
+
+    def start(self):
+        """Starts loading in the background (once); returns self."""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        threading.Thread(target=self._load, daemon=True, name=f"load-{self.name}").start()
+        return self
+
+    def _load(self):
+        print(f"Loading {self.name}...")
+        started = time.perf_counter()
+        try:
+            self._value = self._loader()
+            self.load_seconds = time.perf_counter() - started
+            print(f"{self.name} loaded in {self.load_seconds:.2f}s.")
+        except Exception as e:
+            self._error = e
+            print(f"Error loading {self.name}: {e}")
+            print(traceback.format_exc())
+        finally:
+            self._done.set()
+
+    def get(self, timeout: float = None):
+        """Returns the loaded object, loading it first if needed."""
+        with self._lock:
+            load_inline = not self._started
+            self._started = True
+        if load_inline:
+            self._load()
+        elif not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} is still loading.")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._done.is_set() and self._error is None
+
+    @property
+    def status(self):
+        """One of "not_started", "loading", "loaded" or "failed", with load time or error."""
+        if not self._started:
+            return {"state": "not_started"}
+        if not self._done.is_set():
+            return {"state": "loading"}
+        if self._error is not None:
+            return {"state": "failed", "error": str(self._error)}
+        return {"state": "loaded", "load_seconds": round(self.load_seconds, 3)}
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"): # Never load on private lookups (copy, pickle, ...)
+            raise AttributeError(attr)
+        return getattr(self.get(), attr)
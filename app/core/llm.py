@@ -1,12 +1,85 @@
-from llama_cpp import Llama
+import os
+import time
 
-# Load the quantized phi-2 model (adjust n_threads if needed)
-llm = Llama(
-    model_path="models/phi-2/phi-2.gguf.q4_K_M.bin",
-    n_ctx=2048,
-    n_threads=4
-)
+from app.core import metrics
+from app.core.lazy import LazyModel
 
-def generate_answer(prompt: str) -> str:
-    output = llm(prompt, max_tokens=256, stop=["</s>"])
+LLM_MODEL_PATH = "models/phi-2/phi-2.gguf.q4_K_M.bin"
+N_CTX = 2048             # Prompt and answer together must fit in this many tokens
+MAX_ANSWER_TOKENS = 256
+# RAM for saved KV states of earlier prompts, per model instance (so per LLM replica). Off by default:
+# prompts differ in their retrieved context, so only repeated questions would hit, and the answer cache serves those
+LLM_PROMPT_CACHE_MB = int(os.environ.get("LLM_PROMPT_CACHE_MB", "0"))
+
+def load_llm():
+    """Loads a new instance of the quantized phi-2 model. Each instance must only be used by one thread at a time."""
+    from llama_cpp import Llama, LlamaRAMCache # Imported here so that importing this module stays cheap
+    # Load the quantized phi-2 model (adjust n_threads if needed)
+    model = Llama(
+        model_path=LLM_MODEL_PATH,
+        n_ctx=N_CTX,
+        n_threads=4
+    )
+    if LLM_PROMPT_CACHE_MB > 0:
+        # llama-cpp already skips re-evaluating the prefix shared with the previous prompt (the fixed
+        # header that every template starts with); the cache also resumes from older prompts' KV state
+        model.set_cache(LlamaRAMCache(capacity_bytes=LLM_PROMPT_CACHE_MB << 20))
+    return model
+
+llm = LazyModel("phi-2", load_llm) # Loaded on first use, or in the background after llm.start()
+
+def get_llm():
+    """Returns the shared model instance, waiting for (or doing) the load."""
+    return llm.get()
+
+def count_tokens(text: str) -> int:
+    """
+    Counts phi-2 tokens in text (without BOS). Until the model has loaded this is an
+    estimate from the UTF-8 length (high for English text), so callers never wait for the load.
+    """
+    if not llm.is_loaded:
+        return len(text.encode("utf-8")) // 2 + 1
+    return len(llm.tokenize(text.encode("utf-8"), add_bos=False))
+
+def generate_answer(prompt: str, model=None) -> str:
+    model = model or get_llm()
+    with metrics.timer("generate") as timer:
+        output = model(prompt, max_tokens=MAX_ANSWER_TOKENS, stop=["</s>"])
+    usage = output.get("usage")
+    if usage and timer.seconds:
+        metrics.inc("docqa_llm_tokens_total", usage.get("prompt_tokens", 0), kind="prompt")
+        metrics.inc("docqa_llm_tokens_total", usage.get("completion_tokens", 0), kind="completion")
+        metrics.observe("docqa_llm_tokens_per_second", usage.get("completion_tokens", 0) / timer.seconds, mode="generate")
     return output["choices"][0]["text"].strip()
+
+def generate_answer_stream(prompt: str, model=None):
+    """
+    Yields pieces of the answer as llama-cpp decodes them. Time to the first piece is
+    recorded as the "prefill" stage and the rest as "decode".
+    """
+    model = model or get_llm()
+    if metrics.ENABLED:
+        metrics.inc("docqa_llm_tokens_total", len(model.tokenize(prompt.encode("utf-8"))), kind="prompt")
+    started = False
+    tokens = 0
+    start = time.perf_counter()
+    first_token = None
+    try:
+        for output in model(prompt, max_tokens=MAX_ANSWER_TOKENS, stop=["</s>"], stream=True):
+            tokens += 1 # llama-cpp streams one token per chunk
+            if first_token is None:
+                first_token = time.perf_counter()
+                metrics.observe(metrics.STAGE_SECONDS, first_token - start, stage="prefill")
+            text = output["choices"][0]["text"]
+            if not started:
+                text = text.lstrip() # Match generate_answer's .strip() at the start
+                started = bool(text)
+            if text:
+                yield text
+    finally:
+        if first_token is not None:
+            decode_seconds = time.perf_counter() - first_token
+            metrics.observe(metrics.STAGE_SECONDS, decode_seconds, stage="decode")
+            metrics.inc("docqa_llm_tokens_total", tokens, kind="completion")
+            if tokens > 1 and decode_seconds > 0:
+                metrics.observe("docqa_llm_tokens_per_second", (tokens - 1) / decode_seconds, mode="stream")
@@ -0,0 +1,254 @@
+# File: app/core/metrics.py
+
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+
+# Collection is on unless METRICS_ENABLED is 0/false/no. When off, every call below returns
+# after one flag check and timer() hands back a shared no-op context manager.
+ENABLED = os.environ.get("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no")
+
+STAGE_SECONDS = "docqa_stage_seconds"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_lock = threading.Lock()
+_families = {}  # name -> [type, help, buckets, {labels: value or _Histogram}]
+_callbacks = {} # name -> (help, fn) for gauges computed at scrape time
+_local = threading.local()
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+
+def describe(name: str, kind: str, help_text: str, buckets=LATENCY_BUCKETS):
+    """Declares a metric family ("counter", "gauge" or "histogram") with its help text."""
+    with _lock:
+        _families.setdefault(name, [kind, help_text, tuple(buckets), {}])
+
+
+describe(STAGE_SECONDS, "histogram", "Time spent per pipeline stage, in seconds.")
+describe("docqa_llm_tokens_total", "counter", "Tokens processed by the LLM, by kind (prompt or completion).")
+describe("docqa_llm_tokens_per_second", "histogram",
+         "Generated tokens per second of each LLM answer (mode=stream: decode only; mode=generate: including prefill).",
+         RATE_BUCKETS)
+describe("docqa_embedded_texts_total", "counter", "Texts embedded, by source (model or cache).")
+describe("docqa_extracted_chars_total", "counter", "Characters of text extracted from uploaded files.")
+describe("docqa_chunks_total", "counter", "Chunks produced by the chunker.")
+describe("docqa_http_request_seconds", "histogram", "API request latency until the response starts, in seconds.")
+
+
+def set_enabled(enabled: bool):
+    global ENABLED
+    ENABLED = enabled
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _family(name: str, kind: str):
+    family = _families.get(name)
+    if family is None:
+        describe(name, kind, name)
+        family = _families[name]
+    return family
+
+
+def inc(name: str, value: float = 1, **labels):
+    """Adds value to a counter."""
+    if not ENABLED:
+        return
+    series = _family(name, "counter")[3]
+    key = _labels_key(labels)
+    with _lock:
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    series = _family(name, "gauge")[3]
+    with _lock:
+        series[_labels_key(labels)] = value
+
+
+def register_gauge(name: str, fn, help_text: str = None):
+    """Registers a gauge whose value fn() is read at scrape time (e.g. the index size)."""
+    _callbacks[name] = (help_text or name, fn)
+
+
+def observe(name: str, value: float, **labels):
+    """Records one observation in a histogram."""
+    if not ENABLED:
+        return
+    family = _family(name, "histogram")
+    buckets, series = family[2], family[3]
+    key = _labels_key(labels)
+    with _lock:
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = _Histogram(buckets)
+        histogram.counts[bisect.bisect_left(buckets, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "start", "seconds")
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.seconds = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        observe(self.name, self.seconds, **self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+    seconds = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(stage: str, name: str = STAGE_SECONDS, **labels):
+    """Context manager that records the time spent in its block under the given stage."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, {"stage": stage, **labels})
+
+
+def timed(stage: str):
+    """Decorator form of timer() for whole functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            with _Timer(STAGE_SECONDS, {"stage": stage}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _TimedIter:
+    """
+    Times how long an iterator spends producing items, excluding time spent in timed
+    iterators nested inside it on the same thread (so chunking does not count extraction).
+    The total is recorded once the iterator is exhausted or closed.
+    """
+
+    def __init__(self, iterable, stage):
+        self._it = iter(iterable)
+        self._stage = stage
+        self._seconds = 0.0
+        self._recorded = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        outer_nested = getattr(_local, "nested", 0.0)
+        _local.nested = 0.0
+        start = time.perf_counter()
+        try:
+            return next(self._it)
+        except StopIteration:
+            self._record()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._seconds += elapsed - _local.nested
+            _local.nested = outer_nested + elapsed
+
+    def _record(self):
+        if not self._recorded:
+            self._recorded = True
+            observe(STAGE_SECONDS, self._seconds, stage=self._stage)
+
+    def close(self):
+        close = getattr(self._it, "close", None)
+        if close is not None:
+            close()
+        self._record()
+
+
+def timed_iter(iterable, stage: str):
+    """Wraps an iterator so the time spent producing its items is recorded under stage."""
+    if not ENABLED:
+        return iterable
+    return _TimedIter(iterable, stage)
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """Returns all metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _lock:
+        snapshot = []
+        for name, (kind, help_text, buckets, series) in _families.items():
+            if kind == "histogram":
+                values = {key: (list(h.counts), h.sum, h.count) for key, h in series.items()}
+            else:
+                values = dict(series)
+            snapshot.append((name, kind, help_text, buckets, values))
+    for name, kind, help_text, buckets, series in snapshot:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for key, value in series.items():
+            if kind != "histogram":
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + [math.inf], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+    for name, (help_text, fn) in list(_callbacks.items()):
+        try:
+            value = fn()
+        except Exception as e:
+            print(f"Error reading gauge {name}: {e}")
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,81 @@
+# File: app/core/onnx_encoder.py
+
+import os
+import shutil
+
+import numpy as np
+
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+
+
+def export_onnx(model_source: str, export_dir: str, opset: int = 18):
+    """
+    Exports a Hugging Face encoder to export_dir/ONNX_FILE, with masked mean pooling built
+    into the graph so the session returns sentence embeddings directly. The tokenizer and
+    config are saved next to it, so the directory can later be loaded without PyTorch.
+    Needs torch >= 2.5 with onnxscript (the torch.export-based exporter).
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    class MeanPooled(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            hidden = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                token_type_ids=token_type_ids).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            return (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_source)
+    # Eager attention exports as plain MatMul/Softmax; SDPA adds NaN guards around it that cost ~10% on CPU
+    model = AutoModel.from_pretrained(model_source, attn_implementation="eager").eval()
+    sample = tokenizer(["An example sentence to trace.", "Another, longer example sentence to trace the graph."],
+                       padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    batch, sequence = torch.export.Dim("batch"), torch.export.Dim("sequence")
+
+    tmp_dir = export_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    print(f"Exporting {model_source} to ONNX in {export_dir}...")
+    torch.onnx.export(MeanPooled(model), tuple(sample[name] for name in input_names), os.path.join(tmp_dir, ONNX_FILE),
+                      input_names=input_names, output_names=["embeddings"], opset_version=opset,
+                      dynamic_shapes={name: {0: batch, 1: sequence} for name in input_names}, dynamo=True,
+                      external_data=False)
+    tokenizer.save_pretrained(tmp_dir)
+    model.config.save_pretrained(tmp_dir)
+    shutil.rmtree(export_dir, ignore_errors=True)
+    os.replace(tmp_dir, export_dir) # Only complete exports are ever picked up
+
+
+def quantize_onnx(export_dir: str):
+    """Writes a dynamically int8-quantized copy of the exported model (weights int8, activations quantized at runtime)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    source, target = os.path.join(export_dir, ONNX_FILE), os.path.join(export_dir, ONNX_INT8_FILE)
+    print(f"Quantizing {source} to int8...")
+    quantize_dynamic(source, target + ".tmp", weight_type=QuantType.QInt8)
+    os.replace(target + ".tmp", target)
+
+
+class OnnxEncoder:
+    """Runs an exported encoder with ONNX Runtime on CPU; encode() returns mean-pooled float32 embeddings."""
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1 # One graph runs at a time; parallelism is inside operators
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def encode(self, inputs) -> np.ndarray:
+        feed = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0].astype(np.float32, copy=False)
@@ -0,0 +1,244 @@
+# File: app/core/scheduler.py
+
+import asyncio
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.llm import generate_answer, generate_answer_stream
+
+class QueueFullError(Exception):
+    """Raised when the generation queue is at capacity; the API maps it to HTTP 429."""
+
+    def __init__(self, queue_depth: int):
+        super().__init__(f"Generation queue is full ({queue_depth} requests waiting).")
+        self.queue_depth = queue_depth
+
+
+class EmbeddingBatcher:
+    """
+    Runs the embedding model off the event loop and coalesces concurrent single-text
+    requests that arrive within max_wait_ms of each other into one get_embeddings call.
+
+    All model calls go through one worker thread, so query batches and upload batches
+    never run the model concurrently.
+    """
+
+    def __init__(self, embedding_model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embedding_model = embedding_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.batched_texts = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedder")
+        self._pending = []
+        self._timer = None
+
+    async def embed(self, text: str):
+        """Returns the embedding of one text, computed in a micro-batch with concurrent callers."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    async def embed_many(self, texts):
+        """Embeds a whole list (e.g. an uploaded document) on the embedding thread."""
+        return await self.run(self.embedding_model.get_embeddings, texts)
+
+    async def run(self, fn, *args):
+        """Runs fn(*args) on the embedding thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self.embed_many(texts)
+            self.batches += 1
+            self.batched_texts += len(texts)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class GenerationPool:
+    """
+    Bounded queue in front of a fixed set of LLM replicas.
+
+    Each replica is a separate model instance served by its own thread, so the
+    non-thread-safe llama-cpp objects are never shared. When max_queue requests are
+    already waiting, new requests fail fast with QueueFullError instead of queueing.
+    Replicas load in the background after start(); requests queue until one is ready.
+    """
+
+    def __init__(self, model_factory, replicas: int = 1, max_queue: int = 8):
+        self.model_factory = model_factory # Called with the replica number; returns a model
+        self.replicas = replicas
+        self.max_queue = max_queue
+        self.busy = 0
+        self.loaded_replicas = 0
+        self.load_errors = []
+        self._queue = None
+        self._workers = []
+        self._executors = []
+
+    async def start(self):
+        """Starts one worker task per replica; each loads its model on its own thread first."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        for i in range(self.replicas):
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"llm-{i}")
+            self._executors.append(executor)
+            self._workers.append(asyncio.ensure_future(self._worker(i, executor)))
+        print(f"GenerationPool started with {self.replicas} replica(s), queue size {self.max_queue}. Loading models...")
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_replicas > 0
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        for executor in self._executors:
+            executor.shutdown(wait=False)
+        self._workers, self._executors = [], []
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _submit(self, job):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(self.queue_depth)
+
+    async def generate(self, prompt: str) -> str:
+        """Returns the full answer for prompt once a replica has produced it."""
+        future = asyncio.get_running_loop().create_future()
+        self._submit(("generate", prompt, future))
+        return await future
+
+    def stream(self, prompt: str):
+        """
+        Queues prompt and returns an async iterator over the answer pieces. Raises
+        QueueFullError immediately, before anything is streamed, if the queue is full.
+        """
+        pieces = asyncio.Queue()
+        cancelled = threading.Event()
+        self._submit(("stream", prompt, (pieces, cancelled)))
+
+        async def iterate():
+            try:
+                while True:
+                    kind, value = await pieces.get()
+                    if kind == "piece":
+                        yield value
+                    elif kind == "error":
+                        raise value
+                    else:
+                        return
+            finally:
+                cancelled.set() # Stops decoding if the client goes away
+
+        return iterate()
+
+    async def _load_replica(self, replica: int, executor):
+        try:
+            model = await asyncio.get_running_loop().run_in_executor(executor, self.model_factory, replica)
+            self.loaded_replicas += 1
+            return model, None
+        except Exception as e:
+            print(f"Error loading LLM replica {replica}: {e}")
+            print(traceback.format_exc())
+            self.load_errors.append(str(e))
+            return None, e
+
+    async def _worker(self, replica: int, executor):
+        loop = asyncio.get_running_loop()
+        model, load_error = await self._load_replica(replica, executor)
+        while True:
+            kind, prompt, target = await self._queue.get()
+            self.busy += 1
+            try:
+                if load_error is not None: # Fail requests this replica picks up instead of hanging them
+                    if kind == "generate":
+                        if not target.done():
+                            target.set_exception(load_error)
+                    else:
+                        target[0].put_nowait(("error", load_error))
+                elif kind == "generate":
+                    if target.cancelled():
+                        continue
+                    try:
+                        target.set_result(await loop.run_in_executor(executor, generate_answer, prompt, model))
+                    except Exception as e:
+                        if not target.done():
+                            target.set_exception(e)
+                else:
+                    pieces, cancelled = target
+                    await loop.run_in_executor(executor, self._stream_into, loop, model, prompt, pieces, cancelled)
+            except asyncio.InvalidStateError:
+                pass # Caller gave up while the answer was being generated
+            finally:
+                self.busy -= 1
+                self._queue.task_done()
+
+    @staticmethod
+    def _stream_into(loop, model, prompt, pieces, cancelled):
+        """Runs on the replica thread; hands each piece back to the event loop."""
+        try:
+            for piece in generate_answer_stream(prompt, model):
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(pieces.put_nowait, ("piece", piece))
+            loop.call_soon_threadsafe(pieces.put_nowait, ("done", None))
+        except Exception as e:
+            print(f"Error during streamed generation: {e}")
+            print(traceback.format_exc())
+            loop.call_soon_threadsafe(pieces.put_nowait, ("error", e))
+
+
+class QueryScheduler:
+    """Entry point the API uses for all model work: micro-batched embedding plus the LLM pool."""
+
+    def __init__(self, embedding_model, llm_factory, llm_replicas: int = 1, max_queue: int = 8,
+                 embed_batch_size: int = 32, embed_wait_ms: float = 5.0):
+        self.embedder = EmbeddingBatcher(embedding_model, embed_batch_size, embed_wait_ms)
+        self.generator = GenerationPool(llm_factory, llm_replicas, max_queue)
+
+    async def start(self):
+        await self.generator.start()
+
+    async def stop(self):
+        await self.generator.stop()
+        self.embedder.shutdown()
+
+    @property
+    def stats(self):
+        return {
+            "queue_depth": self.generator.queue_depth,
+            "max_queue": self.generator.max_queue,
+            "busy_replicas": self.generator.busy,
+            "replicas": self.generator.replicas,
+            "loaded_replicas": self.generator.loaded_replicas,
+            "embedding_batches": self.embedder.batches,
+            "embedded_queries": self.embedder.batched_texts,
+        }
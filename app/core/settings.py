@@ -0,0 +1,43 @@
+# File: app/core/settings.py
+"""
+Settings shared by the entry points (main.py, ui.py and ingest.py), which all serve or fill the
+same vector store with the same embedding model, so they must agree on how both are built.
+"""
+import os
+
+from app.core.embedding_cache import EmbeddingCache
+from app.core.embedding_model import EmbeddingModel
+from app.core.sharded_index import open_index
+
+VECTOR_STORE_DIR = "vector_store"
+EMBEDDING_CACHE_DIR = "embedding_cache"
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+EMBEDDING_DIM = 384 # MiniLM has 384-dim embeddings
+
+MODEL_SNAPSHOT_DIR = os.environ.get("MODEL_SNAPSHOT_DIR") # Optional warm snapshot of the embedding model
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch") # torch, onnx or onnx-int8
+ONNX_MODEL_DIR = os.environ.get("ONNX_MODEL_DIR") # Where the ONNX export is kept (default: models/onnx)
+EMBED_THREADS = int(os.environ.get("EMBED_THREADS", "0")) or None # Intra-op threads; default: all cores
+VECTOR_CODEC = os.environ.get("VECTOR_CODEC", "fp32") # fp32, fp16 or int8 vectors in the index; new stores only
+COMPRESS_CHUNK_TEXT = os.environ.get("COMPRESS_CHUNK_TEXT", "0") == "1" # zlib blocks for chunk texts; new stores only
+INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", "0")) # Local shard processes for the index; 0 keeps it in-process
+INDEX_SHARD_ADDRESSES = [a for a in os.environ.get("INDEX_SHARD_ADDRESSES", "").split(",") if a] # host:port of remote shard servers
+SHARD_AUTHKEY = os.environ.get("SHARD_AUTHKEY") # Key shared with remote shard servers
+CONTEXT_MAX_TOKENS = int(os.environ.get("CONTEXT_MAX_TOKENS", "768")) # Fewer context tokens = faster prefill
+CONTEXT_CANDIDATE_CHUNKS = int(os.environ.get("CONTEXT_CANDIDATE_CHUNKS", "5")) # Chunks the context is packed from
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "512")) # Answers kept for repeated questions; 0 disables
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95")) # Question cosine that counts as the same
+
+def load_embedding_model(batch_size: int = 32, warm_up: bool = True):
+    """Loads the embedding model with its cache, warmed up unless warm_up is False."""
+    # int8 vectors differ slightly from full-precision ones, so they are cached separately
+    cache_name = EMBEDDING_MODEL_NAME + ("#int8" if EMBEDDING_BACKEND == "onnx-int8" else "")
+    model = EmbeddingModel(model_name=EMBEDDING_MODEL_NAME, batch_size=batch_size, snapshot_dir=MODEL_SNAPSHOT_DIR,
+                           backend=EMBEDDING_BACKEND, onnx_dir=ONNX_MODEL_DIR, num_threads=EMBED_THREADS,
+                           cache=EmbeddingCache(cache_name, cache_dir=EMBEDDING_CACHE_DIR))
+    return model.warm_up() if warm_up else model
+
+def open_vector_index(store_dir: str = VECTOR_STORE_DIR):
+    """Opens the vector store (sharded if INDEX_SHARDS or INDEX_SHARD_ADDRESSES is set); memory-mapped, so cheap."""
+    return open_index(store_dir, dim=EMBEDDING_DIM, shards=INDEX_SHARDS, addresses=INDEX_SHARD_ADDRESSES,
+                      authkey=SHARD_AUTHKEY, vector_codec=VECTOR_CODEC, compress_text=COMPRESS_CHUNK_TEXT)
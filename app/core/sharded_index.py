@@ -0,0 +1,670 @@
+# File: app/core/sharded_index.py
+"""
+A FaissIndex split across shard server processes, local or on other hosts.
+
+Each shard is a FaissIndex with its own store directory, served over
+multiprocessing.connection (pickled calls, authenticated with a shared key).
+ShardedIndex places each document on one shard, searches all shards in
+parallel and merges their top-k by distance.
+
+Run a shard on another host (SHARD_AUTHKEY must match the API process):
+    SHARD_AUTHKEY=secret python -m app.core.sharded_index --host 0.0.0.0 --port 6100 --store-dir /data/shard-a
+"""
+
+import argparse
+import atexit
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+import numpy as np
+
+from app.core import metrics
+from app.core.faiss_wrapper import ADD_BATCH_ROWS, MANIFEST_FILE, FaissIndex
+
+SHARD_ID_BITS = 10           # Chunk ids returned by ShardedIndex are (local id << SHARD_ID_BITS) | shard
+REBALANCE_RATIO = 1.5        # Move documents once the fullest shard holds this many times the emptiest one's chunks ...
+REBALANCE_MIN_GAP = 1_000    # ... and at least this many more
+SCATTER_THREADS = 32
+UNATTRIBUTED_DOC_ID = "unattributed" # import_index() puts chunks that belong to no document in this document
+READY_PREFIX = "SHARD_READY" # Printed by a shard server once it accepts connections: "SHARD_READY host port"
+_ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_READ_METHODS = {"search_batch", "document_of", "export_document"} # Share the shard's lock with each other
+_WRITE_METHODS = {"add_batch", "new_document", "remove_document", "save", "wait_for_rebuild", "reset"} # Hold it alone
+_UNCHANGED_BY = {"save", "wait_for_rebuild"} # Writes that leave the shard's documents as they are (and its version)
+
+
+class _ReadWriteLock:
+    """Lets any number of readers hold it at once, or one writer alone; a waiting writer keeps new readers out."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writing or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+def _describe(index: FaissIndex, version):
+    return {"dimension": index.dimension, "live_count": index.live_count, "documents": index.documents,
+            "version": tuple(version)}
+
+
+def _handle(conn, index: FaissIndex, lock: _ReadWriteLock, version):
+    """
+    Serves one client connection: receives (method, args, kwargs), replies (ok, result or exception,
+    the shard's version after a write or None).
+    """
+    with conn:
+        while True:
+            try:
+                method, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method == "version":
+                    with lock.read():
+                        reply = (True, tuple(version), None)
+                elif method == "describe":
+                    with lock.read():
+                        reply = (True, _describe(index, version), None)
+                elif method in _READ_METHODS:
+                    with lock.read():
+                        reply = (True, getattr(index, method)(*args, **kwargs), None)
+                elif method in _WRITE_METHODS:
+                    with lock.write():
+                        if method not in _UNCHANGED_BY:
+                            version[1] += 1
+                        reply = (True, getattr(index, method)(*args, **kwargs), tuple(version))
+                else:
+                    reply = (False, AttributeError(f"Shard does not serve '{method}'."), None)
+            except Exception as e:
+                reply = (False, e, None)
+            try:
+                conn.send(reply)
+            except Exception as e: # E.g. an exception that cannot be pickled
+                conn.send((False, RuntimeError(f"{type(e).__name__}: {e}"), None))
+
+
+def serve_shard(host: str, port: int, authkey: bytes, index: FaissIndex):
+    """
+    Serves index on host:port until the process exits, one thread per client connection.
+    Searches and other reads run concurrently; each write runs alone, as FaissIndex is not thread-safe.
+    The shard's version, [server id, writes served], lets clients notice writes made by other clients.
+    """
+    lock = _ReadWriteLock()
+    version = [uuid.uuid4().hex, 0]
+    with Listener((host, port), authkey=authkey) as listener:
+        print(f"{READY_PREFIX} {listener.address[0]} {listener.address[1]}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e: # Failed handshake (e.g. wrong key); keep serving
+                print(f"Warning: Rejected shard client: {e}")
+                continue
+            threading.Thread(target=_handle, args=(conn, index, lock, version), daemon=True).start()
+
+
+class ShardClient:
+    """Calls methods of a remote shard; keeps a pool of connections so concurrent calls run in parallel."""
+
+    def __init__(self, address, authkey: bytes, process: subprocess.Popen = None):
+        self.address = tuple(address)
+        self.process = process # Set for shards started by ShardedIndex.spawn()
+        self._authkey = authkey
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args, **kwargs):
+        return self.call_versioned(method, *args, **kwargs)[0]
+
+    def call_versioned(self, method: str, *args, **kwargs):
+        """Returns (result, the shard's version right after the call); the version is None except for writes."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = Client(self.address, authkey=self._authkey)
+        try:
+            conn.send((method, args, kwargs))
+            ok, result, version = conn.recv()
+        except BaseException:
+            conn.close()
+            raise
+        with self._lock:
+            self._idle.append(conn)
+        if not ok:
+            raise result
+        return result, version
+
+    def close(self):
+        with self._lock:
+            for conn in self._idle:
+                conn.close()
+            self._idle = []
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def _start_local_shard(name: str, store_dir: str, dim: int, authkey: bytes, index_kwargs) -> ShardClient:
+    """Starts a shard server subprocess on a free localhost port and returns a client for it."""
+    command = [sys.executable, "-m", "app.core.sharded_index", "--host", "127.0.0.1", "--port", "0",
+               "--store-dir", os.path.abspath(store_dir), "--dim", str(dim), "--exit-with-parent"]
+    for key, value in index_kwargs.items():
+        command += [f"--{key.replace('_', '-')}", str(value)]
+    env = dict(os.environ, SHARD_AUTHKEY=authkey.decode(), PYTHONUNBUFFERED="1",
+               PYTHONPATH=os.pathsep.join(filter(None, [_ROOT_DIR, os.environ.get("PYTHONPATH")])))
+    process = subprocess.Popen(command, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, bufsize=1)
+    for line in process.stdout:
+        if line.startswith(READY_PREFIX):
+            _, host, port = line.split()
+            break
+        print(f"[{name}] {line}", end="")
+    else:
+        raise RuntimeError(f"Shard server {name} exited with code {process.wait()} before it was ready.")
+
+    def relay_output(): # Drained so the shard never blocks on a full pipe
+        for line in process.stdout:
+            print(f"[{name}] {line}", end="")
+    threading.Thread(target=relay_output, daemon=True, name=f"{name}-output").start()
+    return ShardClient((host, int(port)), authkey, process=process)
+
+
+class ShardedIndex:
+    """
+    Same interface as FaissIndex, with chunks partitioned across shard servers.
+
+    Every chunk of a document lives on one shard, which new_document() picks as the one with
+    the fewest chunks, so filtering and removal by document touch a single shard. Searches go
+    to all shards (or just those holding doc_ids) in parallel, and the per-shard top-k are
+    merged by distance. save() first rebalances: while the fullest shard holds REBALANCE_RATIO
+    times as many chunks as the emptiest, whole documents are moved between them. Adding a
+    shard (add_shard) rebalances right away.
+
+    Several ShardedIndex instances may share shards (e.g. API replicas and ingest.py). Each one
+    mirrors the shards' documents and sizes, and before reads it asks every shard for its version
+    and re-reads the shards that were written to since it last looked, so writes made through
+    another instance show up in searches, documents and version. When two instances move the
+    same document at once, the second to finish drops its copy again.
+    """
+
+    def __init__(self, shards, dim: int, store_dir: str = None, authkey: bytes = None, index_kwargs=None):
+        """Use spawn() for local shard processes, or connect() for running shard servers."""
+        self.shards = list(shards)
+        self.store_dir = store_dir # Local shards live in store_dir/shard-<i>; ingestion checkpoints go here
+        self._version = 0
+        self._documents = {} # doc_id -> metadata, mirrored from the shards
+        self._placement = {} # doc_id -> shard number
+        self._sizes = [] # Live chunks per shard
+        self._shard_versions = [] # Version of each shard when it was last described
+        self._dimension = dim
+        self._authkey = authkey
+        self._index_kwargs = index_kwargs or {}
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=SCATTER_THREADS, thread_name_prefix="shard")
+        self._moved_from = set() # Shards that gave up documents since the last save
+        for shard, description in enumerate(self._scatter(lambda client: client.call("describe"))):
+            self._register(shard, description)
+        print(f"Initialized ShardedIndex over {len(self.shards)} shards with {self.live_count} chunks "
+              f"in {len(self._documents)} documents.")
+        atexit.register(self.close)
+
+    @classmethod
+    def spawn(cls, num_shards: int, dim: int, store_dir: str, **index_kwargs):
+        """
+        Starts num_shards local shard server processes over store_dir/shard-<i> (more if more
+        shard directories already exist, so no data is left behind). An unsharded index saved
+        in store_dir itself is moved into the shards the first time.
+        """
+        os.makedirs(store_dir, exist_ok=True)
+        existing = sum(1 for name in os.listdir(store_dir) if name.startswith("shard-"))
+        authkey = secrets.token_hex(16).encode()
+        with ThreadPoolExecutor(max_workers=max(num_shards, existing)) as pool:
+            shards = list(pool.map(lambda i: _start_local_shard(f"shard-{i}", os.path.join(store_dir, f"shard-{i}"),
+                                                                 dim, authkey, index_kwargs),
+                                   range(max(num_shards, existing))))
+        instance = cls(shards, dim, store_dir=store_dir, authkey=authkey, index_kwargs=index_kwargs)
+        if os.path.exists(os.path.join(store_dir, MANIFEST_FILE)):
+            instance.import_index(FaissIndex.load(store_dir))
+            os.replace(os.path.join(store_dir, MANIFEST_FILE), os.path.join(store_dir, MANIFEST_FILE + ".sharded"))
+        elif instance._imbalanced():
+            instance.save()
+        return instance
+
+    @classmethod
+    def connect(cls, addresses, dim: int, authkey: bytes, store_dir: str = None):
+        """Connects to shard servers already running at addresses [(host, port), ...]."""
+        return cls([ShardClient(address, authkey) for address in addresses], dim, store_dir=store_dir, authkey=authkey)
+
+    def _register(self, shard: int, description):
+        if description["dimension"] != self.dimension:
+            raise ValueError(f"Shard {shard} has dimension {description['dimension']}, expected {self.dimension}.")
+        self._sizes.append(description["live_count"])
+        self._shard_versions.append(description["version"])
+        for doc_id, meta in description["documents"].items():
+            if doc_id in self._placement: # Saved on both sides of an interrupted move; keep the first copy
+                print(f"Warning: Document {doc_id} is on shards {self._placement[doc_id]} and {shard}; removing it from {shard}.")
+                self._sizes[shard] -= self._write(shard, "remove_document", doc_id)
+                self._moved_from.add(shard)
+                continue
+            self._documents[doc_id] = meta
+            self._placement[doc_id] = shard
+
+    def _write(self, shard: int, method: str, *args, **kwargs):
+        """
+        Calls a write on a shard. When it was the only write since the facade last looked, the
+        facade's own update of its view is current, so the next refresh does not re-read the shard.
+        """
+        result, version = self.shards[shard].call_versioned(method, *args, **kwargs)
+        known = self._shard_versions[shard]
+        if known is not None and tuple(version) == (known[0], known[1] + 1):
+            self._shard_versions[shard] = version
+        return result
+
+    def _refresh(self):
+        """Re-reads the documents and sizes of shards whose version changed since they were last described."""
+        def version_of(client):
+            try:
+                return client.call("version")
+            except Exception as e: # Searches skip a failing shard; keep what is known of it
+                print(f"Warning: Could not get the version of shard {client.address}: {type(e).__name__}: {e}")
+                return None
+        versions = self._scatter(version_of)
+        if all(version is None or version == known for version, known in zip(versions, self._shard_versions)):
+            return
+        with self._lock:
+            changed = [shard for shard, version in enumerate(versions)
+                       if version is not None and version != self._shard_versions[shard]]
+            descriptions = self._scatter(lambda client: client.call("describe"), changed)
+            for doc_id in [doc_id for doc_id, shard in self._placement.items() if shard in changed]:
+                del self._documents[doc_id], self._placement[doc_id]
+            for shard, description in zip(changed, descriptions):
+                self._sizes[shard] = description["live_count"]
+                self._shard_versions[shard] = description["version"]
+                for doc_id, meta in description["documents"].items():
+                    if self._placement.setdefault(doc_id, shard) == shard: # Else mid-move; keep one copy
+                        self._documents[doc_id] = meta
+            self._version += 1
+
+    @property
+    def dimension(self):
+        """Returns the dimension of the index."""
+        return self._dimension
+
+    @property
+    def live_count(self) -> int:
+        """Number of chunks that have not been removed, across all shards."""
+        self._refresh()
+        return sum(self._sizes)
+
+    @property
+    def documents(self):
+        """doc_id -> metadata of every document on the shards."""
+        self._refresh()
+        return self._documents
+
+    @property
+    def version(self) -> int:
+        """Bumped whenever the searchable contents change, here or through another ShardedIndex."""
+        self._refresh()
+        return self._version
+
+    def _scatter(self, fn, shards=None):
+        """Runs fn(client) for each shard (all by default) in parallel; returns the results in order."""
+        shards = range(len(self.shards)) if shards is None else shards
+        return list(self._pool.map(lambda shard: fn(self.shards[shard]), shards))
+
+    def _emptiest(self) -> int:
+        return int(np.argmin(self._sizes))
+
+    def new_document(self, filename: str = None, tenant: str = None, doc_id: str = None, **metadata) -> str:
+        """Registers a document on the shard with the fewest chunks and returns its id."""
+        with self._lock:
+            doc_id = doc_id or uuid.uuid4().hex
+            if doc_id in self._documents:
+                raise ValueError(f"Document id '{doc_id}' already exists.")
+            shard = self._emptiest()
+            metadata = {"uploaded_at": time.time(), **metadata}
+            self._write(shard, "new_document", filename, tenant=tenant, doc_id=doc_id, **metadata)
+            self._documents[doc_id] = {"doc_id": doc_id, "filename": filename, "tenant": tenant, "chunks": 0, **metadata}
+            self._placement[doc_id] = shard
+            return doc_id
+
+    def list_documents(self, tenant: str = None, filename: str = None):
+        """Metadata of the indexed documents, optionally only those of a tenant and/or filename."""
+        return [dict(meta) for meta in self.documents.values()
+                if (tenant is None or meta["tenant"] == tenant) and (filename is None or meta["filename"] == filename)]
+
+    def add(self, embedding: np.ndarray, chunk: str):
+        """Adds a single embedding and its corresponding text chunk."""
+        try:
+            self.add_batch(np.asarray(embedding, dtype=np.float32).reshape(1, -1), [chunk])
+        except Exception as e:
+            print(f"Error adding embedding/chunk: {e}")
+            print(traceback.format_exc())
+
+    @metrics.timed("index")
+    def add_batch(self, embeddings: np.ndarray, chunks, doc_id: str = None):
+        """
+        Adds an (N, dim) matrix of embeddings and their N text chunks to the shard of doc_id,
+        or to the emptiest shard for chunks without a document.
+        """
+        with self._lock:
+            if doc_id is not None and doc_id not in self._documents and doc_id not in self.documents:
+                raise KeyError(f"Unknown document id '{doc_id}'.")
+            shard = self._placement[doc_id] if doc_id is not None else self._emptiest()
+            self._write(shard, "add_batch", np.ascontiguousarray(embeddings, dtype=np.float32), list(chunks), doc_id=doc_id)
+            self._sizes[shard] += len(chunks)
+            if doc_id is not None:
+                self._documents[doc_id]["chunks"] += len(chunks)
+            self._version += 1
+
+    @metrics.timed("remove_document")
+    def remove_document(self, doc_id: str) -> int:
+        """Removes a document from its shard. Returns the number of chunks removed."""
+        with self._lock:
+            if doc_id not in self.documents:
+                raise KeyError(f"Unknown document id '{doc_id}'.")
+            shard = self._placement[doc_id]
+            removed = self._write(shard, "remove_document", doc_id)
+            del self._documents[doc_id], self._placement[doc_id]
+            self._sizes[shard] -= removed
+            self._version += 1
+            return removed
+
+    def document_of(self, chunk_id: int):
+        """Metadata of the document a chunk id (as returned by search_batch) belongs to, or None."""
+        shard = chunk_id & ((1 << SHARD_ID_BITS) - 1)
+        return self.shards[shard].call("document_of", chunk_id >> SHARD_ID_BITS)
+
+    @metrics.timed("search")
+    def search_batch(self, query_vectors: np.ndarray, top_k=3, nprobe: int = None, ef_search: int = None,
+                     doc_ids=None):
+        """
+        Searches every shard (or those holding doc_ids) in parallel and merges the results.
+        A shard that fails is skipped with a warning, unless all of them fail.
+
+        Returns:
+            A tuple (distances, ids, results) as FaissIndex.search_batch does; ids are
+            (shard-local id << SHARD_ID_BITS) | shard.
+        """
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        num_queries = query_vectors.shape[0]
+        self._refresh()
+        if doc_ids is None:
+            targets = {shard: None for shard, size in enumerate(self._sizes) if size > 0}
+        else:
+            targets = {}
+            for doc_id in doc_ids:
+                if doc_id in self._placement:
+                    targets.setdefault(self._placement[doc_id], []).append(doc_id)
+        shards = sorted(targets)
+
+        def search_shard(shard):
+            try:
+                return self.shards[shard].call("search_batch", query_vectors, top_k, nprobe=nprobe,
+                                               ef_search=ef_search, doc_ids=targets[shard])
+            except Exception as e:
+                print(f"Warning: Search on shard {shard} failed: {type(e).__name__}: {e}")
+                return e
+        replies = list(self._pool.map(search_shard, shards))
+        answered = [(shard, reply) for shard, reply in zip(shards, replies) if not isinstance(reply, Exception)]
+        if shards and not answered:
+            raise replies[0]
+        if not answered:
+            return (np.empty((num_queries, 0), dtype=np.float32), np.empty((num_queries, 0), dtype=np.int64),
+                    [[] for _ in range(num_queries)])
+
+        distances = np.concatenate([np.where(ids >= 0, d, np.inf) for _, (d, ids, _) in answered], axis=1)
+        ids = np.concatenate([np.where(ids >= 0, (ids << SHARD_ID_BITS) | shard, -1) for shard, (_, ids, _) in answered], axis=1)
+        texts = [[text for _, (_, shard_ids, results) in answered for text in _padded(results[q], shard_ids.shape[1])]
+                 for q in range(num_queries)]
+        order = np.argsort(distances, axis=1, kind="stable")[:, :top_k]
+        merged_ids = np.take_along_axis(ids, order, axis=1)
+        results = [[texts[q][j] for j, i in zip(order[q], merged_ids[q]) if i >= 0] for q in range(num_queries)]
+        merged_distances = np.take_along_axis(distances, order, axis=1)
+        merged_distances[merged_ids < 0] = np.finfo(np.float32).max # As FAISS reports missing neighbours
+        return merged_distances.astype(np.float32), merged_ids, results
+
+    def search(self, query_vector: np.ndarray, top_k=3, nprobe: int = None, ef_search: int = None, doc_ids=None):
+        """Searches all shards for the top_k nearest neighbors; returns their text chunks."""
+        try:
+            if not self.is_ready():
+                print("Warning: Searching an empty or non-ready index.")
+                return []
+            _, _, results = self.search_batch(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), top_k,
+                                              nprobe=nprobe, ef_search=ef_search, doc_ids=doc_ids)
+            return results[0]
+        except Exception as e:
+            print(f"Error during search: {e}")
+            print(traceback.format_exc())
+            return []
+
+    def _imbalanced(self) -> bool:
+        fullest, emptiest = max(self._sizes), min(self._sizes)
+        return fullest - emptiest >= REBALANCE_MIN_GAP and fullest > REBALANCE_RATIO * emptiest
+
+    def rebalance(self) -> int:
+        """
+        Moves whole documents from the fullest to the emptiest shard while they are out of
+        balance and a document small enough to narrow the gap exists. Returns the number moved.
+        """
+        moved = 0
+        with self._lock:
+            self._refresh()
+            while len(self.shards) > 1 and self._imbalanced():
+                source, target = int(np.argmax(self._sizes)), self._emptiest()
+                gap = self._sizes[source] - self._sizes[target]
+                candidates = [(self._documents[doc_id]["chunks"], doc_id) for doc_id, shard in self._placement.items()
+                              if shard == source and 0 < self._documents[doc_id]["chunks"] <= gap // 2]
+                if not candidates:
+                    break
+                moved += self._move(max(candidates)[1], target)
+        if moved:
+            print(f"Rebalanced ShardedIndex: moved {moved} documents. Chunks per shard: {self._sizes}")
+        return moved
+
+    def _move(self, doc_id: str, target: int):
+        """Copies a document to the target shard, then removes it from its current one. Returns whether it moved."""
+        source = self._placement[doc_id]
+        try:
+            meta, embeddings, chunks = self.shards[source].call("export_document", doc_id)
+            self._import(target, meta, embeddings, chunks)
+        except (KeyError, ValueError) as e: # Removed, or already copied to target, through another ShardedIndex
+            print(f"Warning: Not moving document {doc_id}: {e}")
+            self._shard_versions[source] = self._shard_versions[target] = None # Re-described right away
+            self._refresh()
+            return False
+        try:
+            self._write(source, "remove_document", doc_id)
+        except KeyError: # Another ShardedIndex moved (or removed) it meanwhile; drop this copy
+            print(f"Warning: Document {doc_id} left shard {source} during the move; removing the copy on {target}.")
+            self.shards[target].call("remove_document", doc_id)
+            self._moved_from.add(target)
+            self._shard_versions[source] = self._shard_versions[target] = None
+            self._refresh()
+            return False
+        self._sizes[source] -= len(chunks)
+        self._placement[doc_id] = target
+        self._moved_from.add(source)
+        self._version += 1
+        return True
+
+    def _import(self, shard: int, meta, embeddings: np.ndarray, chunks):
+        fields = {key: value for key, value in meta.items() if key not in ("doc_id", "chunks")}
+        self._write(shard, "new_document", doc_id=meta["doc_id"], **fields)
+        for start in range(0, len(chunks), ADD_BATCH_ROWS):
+            self._write(shard, "add_batch", embeddings[start:start + ADD_BATCH_ROWS],
+                                    chunks[start:start + ADD_BATCH_ROWS], doc_id=meta["doc_id"])
+        self._sizes[shard] += len(chunks)
+
+    def import_index(self, index: FaissIndex) -> int:
+        """
+        Copies every document of an (unsharded) FaissIndex into the shards and saves them. Chunks
+        that belong to no document are imported as the document UNATTRIBUTED_DOC_ID. Returns the
+        number of documents imported; documents already on the shards are skipped.
+        """
+        def place(meta, embeddings, chunks):
+            shard = self._emptiest()
+            self._import(shard, meta, embeddings, chunks)
+            self._documents[meta["doc_id"]] = dict(meta)
+            self._placement[meta["doc_id"]] = shard
+
+        imported = 0
+        with self._lock:
+            for doc_id in list(index.documents):
+                if doc_id not in self._documents:
+                    place(*index.export_document(doc_id))
+                    imported += 1
+            embeddings, chunks = index.export_unattributed()
+            if chunks and UNATTRIBUTED_DOC_ID not in self._documents:
+                print(f"Importing {len(chunks)} chunks without a document as document '{UNATTRIBUTED_DOC_ID}'.")
+                place({"doc_id": UNATTRIBUTED_DOC_ID, "filename": None, "tenant": None, "uploaded_at": time.time(),
+                       "chunks": len(chunks)}, embeddings, chunks)
+                imported += 1
+            self._version += 1
+            self.save()
+        print(f"Imported {imported} documents from {index.store_dir} into {len(self.shards)} shards.")
+        return imported
+
+    def add_shard(self, address=None):
+        """Adds a shard (a new local process when address is None, else the server at address) and rebalances."""
+        with self._lock:
+            shard = len(self.shards)
+            if address is None:
+                if self.store_dir is None:
+                    raise ValueError("ShardedIndex has no store_dir for a local shard.")
+                client = _start_local_shard(f"shard-{shard}", os.path.join(self.store_dir, f"shard-{shard}"),
+                                            self.dimension, self._authkey, self._index_kwargs)
+            else:
+                client = ShardClient(address, self._authkey)
+            self.shards.append(client)
+            self._register(shard, client.call("describe"))
+            self.save()
+
+    @metrics.timed("save")
+    def save(self):
+        """
+        Rebalances if needed, then saves every shard in parallel. Shards that gave up documents
+        are saved last, so an interrupted save never loses a moved document (it may briefly
+        exist twice, which loading resolves).
+        """
+        with self._lock:
+            if len(self.shards) > 1 and self._imbalanced():
+                self.rebalance()
+            receivers = [shard for shard in range(len(self.shards)) if shard not in self._moved_from]
+            self._scatter(lambda client: client.call("save"), receivers)
+            self._scatter(lambda client: client.call("save"), sorted(self._moved_from))
+            self._moved_from.clear()
+
+    def wait_for_rebuild(self):
+        """Waits for background index rebuilds on every shard to finish (see FaissIndex.wait_for_rebuild)."""
+        self._scatter(lambda client: client.call("wait_for_rebuild"))
+
+    def reset(self):
+        """Removes all chunks and documents from every shard."""
+        with self._lock:
+            self._scatter(lambda client: client.call("reset"))
+            self._documents, self._placement = {}, {}
+            self._sizes = [0] * len(self.shards)
+            self._version += 1
+
+    def close(self):
+        """Closes connections and stops shard processes started by spawn() (unsaved changes are lost)."""
+        for client in self.shards:
+            client.close()
+        self._pool.shutdown(wait=False)
+
+    def is_ready(self):
+        """Checks if any shard holds live chunks."""
+        return self.live_count > 0
+
+    def __len__(self):
+        """Returns the number of live chunks across shards."""
+        return self.live_count
+
+
+def _padded(results, width: int):
+    """A shard's result texts padded with None to the width of its ids rows (results skip ids of -1)."""
+    return list(results) + [None] * (width - len(results))
+
+
+def open_index(store_dir: str, dim: int, shards: int = 0, addresses=None, authkey: str = None, **index_kwargs):
+    """
+    The index to serve: a FaissIndex in this process when shards is 0 and no addresses are given,
+    else a ShardedIndex over `shards` local worker processes or the shard servers at addresses
+    ("host:port" strings).
+    """
+    if addresses:
+        if not authkey:
+            raise ValueError("Remote shards need SHARD_AUTHKEY.")
+        parsed = [(address.rsplit(":", 1)[0], int(address.rsplit(":", 1)[1])) for address in addresses]
+        return ShardedIndex.connect(parsed, dim, authkey.encode(), store_dir=store_dir)
+    if shards > 0:
+        return ShardedIndex.spawn(shards, dim, store_dir, **index_kwargs)
+    return FaissIndex.open(store_dir, dim, **index_kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6100, help="0 picks a free port")
+    parser.add_argument("--store-dir", required=True, help="Directory this shard's index is saved in")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="auto")
+    parser.add_argument("--vector-codec", default="fp32")
+    parser.add_argument("--compress-text", default="False", help="True stores chunk text in zlib blocks")
+    parser.add_argument("--exit-with-parent", action="store_true", help="Exit when stdin closes (used by spawn())")
+    args = parser.parse_args()
+
+    authkey = os.environ.get("SHARD_AUTHKEY")
+    if not authkey:
+        parser.error("Set SHARD_AUTHKEY to the key shared with the API process.")
+    if args.exit_with_parent:
+        def exit_with_parent():
+            sys.stdin.read()
+            os._exit(0)
+        threading.Thread(target=exit_with_parent, daemon=True).start()
+    index = FaissIndex.open(args.store_dir, args.dim, index_type=args.index_type, vector_codec=args.vector_codec,
+                            compress_text=args.compress_text == "True")
+    serve_shard(args.host, args.port, authkey.encode(), index)
+
+
+if __name__ == "__main__":
+    main()
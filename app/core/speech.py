@@ -0,0 +1,157 @@
+# File: app/core/speech.py
+
+import hashlib
+import io
+import queue
+import re
+import threading
+import traceback
+import wave
+
+from app.core import metrics
+from app.core.file_store import FileLRU
+
+_SENTENCE_END = re.compile(r'(?<=[.!?:;])\s+|\n+')
+MIN_SENTENCE_CHARS = 24 # Shorter pieces ("Yes.", "Dr.") wait for the next sentence, so Piper gets natural phrases
+
+class AudioCache:
+    """
+    On-disk cache of synthesized speech, one WAV file per text keyed by a hash of voice and text.
+    Bounded by total size (a FileLRU).
+    """
+
+    def __init__(self, voice_name: str, cache_dir: str, max_bytes: int = 256 * 1024 * 1024):
+        self.voice_name = voice_name
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._files = FileLRU(cache_dir, ".wav", max_bytes, label="audio cache")
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.voice_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str):
+        """Returns the cached WAV bytes for text, or None."""
+        return self._files.get(self.key(text))
+
+    def put(self, text: str, data: bytes):
+        self._files.put(self.key(text), data)
+
+    @property
+    def stats(self):
+        return self._files.stats
+
+
+def synthesize_wav(voice, text: str) -> bytes:
+    """Synthesizes text with a Piper voice into WAV bytes in memory."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav: # Piper sets the format (rate, width, channels) and writes the frames
+        voice.synthesize(text, wav)
+    return buffer.getvalue()
+
+
+def join_wav(parts) -> bytes:
+    """Concatenates WAV byte strings of the same format into one."""
+    if len(parts) == 1:
+        return parts[0]
+    frames, params = [], None
+    for data in parts:
+        with wave.open(io.BytesIO(data), "rb") as wav:
+            params = params or wav.getparams()
+            frames.append(wav.readframes(wav.getnframes()))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setparams(params)
+        wav.writeframes(b"".join(frames))
+    return buffer.getvalue()
+
+
+class SentenceSpeaker:
+    """
+    Speaks text as it is generated: feed() it pieces of the answer and each complete sentence is
+    synthesized on a worker thread while generation goes on. take() returns the audio finished
+    so far (or None) without waiting; after close(), remaining() yields the rest as it is ready.
+
+    get_voice is called on the worker thread, so a voice still loading never delays the text;
+    when it returns None, nothing is spoken.
+    """
+
+    def __init__(self, get_voice, cache: AudioCache = None):
+        self._get_voice = get_voice
+        self._cache = cache
+        self._pending = ""
+        self._sentences = queue.Queue()
+        self._audio = queue.Queue() # WAV bytes per sentence, then None once the worker is done
+        self._cancelled = False
+        self._done = False
+        threading.Thread(target=self._work, daemon=True, name="tts").start()
+
+    def feed(self, text: str):
+        self._pending += text
+        last = 0
+        for match in _SENTENCE_END.finditer(self._pending):
+            if match.start() - last >= MIN_SENTENCE_CHARS:
+                self._sentences.put(self._pending[last:match.start()].strip())
+                last = match.end()
+        self._pending = self._pending[last:]
+
+    def close(self):
+        """Marks the end of the text; whatever is left is spoken as the last sentence."""
+        if self._pending.strip():
+            self._sentences.put(self._pending.strip())
+        self._pending = ""
+        self._sentences.put(None)
+
+    def cancel(self):
+        """Stops speaking (e.g. the client went away); the worker exits after its current sentence."""
+        self._cancelled = True
+        self._sentences.put(None)
+
+    def take(self):
+        """All audio synthesized since the last call, as one chunk of WAV bytes, or None."""
+        chunks = []
+        while True:
+            try:
+                chunk = self._audio.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                self._done = True
+                break
+            chunks.append(chunk)
+        return join_wav(chunks) if chunks else None
+
+    def remaining(self):
+        """After close(): yields each remaining chunk of audio, waiting for it to be synthesized."""
+        while not self._done:
+            chunk = self._audio.get()
+            if chunk is None:
+                self._done = True
+            else:
+                yield chunk
+
+    def _work(self):
+        try:
+            voice = None
+            while True:
+                sentence = self._sentences.get()
+                if sentence is None or self._cancelled:
+                    break
+                if not sentence:
+                    continue
+                data = self._cache.get(sentence) if self._cache is not None else None
+                if data is None:
+                    voice = voice or self._get_voice()
+                    if voice is None:
+                        print("Skipping speech generation: TTS voice not loaded.")
+                        break
+                    with metrics.timer("tts"):
+                        data = synthesize_wav(voice, sentence)
+                    if self._cache is not None:
+                        self._cache.put(sentence, data)
+                self._audio.put(data)
+        except Exception as e:
+            print(f"Error during TTS synthesis: {e}")
+            traceback.print_exc()
+        finally:
+            self._audio.put(None)
+
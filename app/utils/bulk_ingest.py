@@ -0,0 +1,168 @@
+# File: app/utils/bulk_ingest.py
+
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.chunker import split_text_stream
+from app.utils.file_reader import SUPPORTED_EXTENSIONS, iter_text_from_raw
+from app.utils.pipeline import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+
+CHECKPOINT_FILE = "ingest_checkpoint.json" # Next to the index: hashes of files that yielded no text
+HASH_BLOCK_BYTES = 1 << 20
+
+_worker = {} # Per-process chunking settings, set by _init_worker
+
+def iter_files(root: str, extensions=SUPPORTED_EXTENSIONS):
+    """Yields the paths of supported files under root, in a stable (sorted) order."""
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in extensions:
+                yield os.path.join(directory, name)
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _init_worker(tokenizer, max_tokens: int, overlap_tokens: int, known_hashes):
+    _worker.update(tokenizer=tokenizer, max_tokens=max_tokens, overlap_tokens=overlap_tokens, known=known_hashes)
+
+def _extract_and_chunk(path: str):
+    """
+    Runs in a worker process: hashes the file and, unless its contents are already indexed,
+    extracts and chunks it. Returns (path, hash, chunks or None if already indexed, error).
+    """
+    try:
+        content_hash = file_hash(path)
+        if content_hash in _worker["known"]:
+            return path, content_hash, None, None
+        ext = os.path.splitext(path)[1].lower()
+        segments = iter_text_from_raw(path, ext, workers=1) # Parallelism is across files here
+        chunks = list(split_text_stream(segments, _worker["max_tokens"], _worker["tokenizer"], _worker["overlap_tokens"]))
+        return path, content_hash, chunks, None
+    except Exception as e:
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+def _load_checkpoint(store_dir: str):
+    try:
+        with open(os.path.join(store_dir, CHECKPOINT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"empty": {}}
+
+def _save_checkpoint(store_dir: str, checkpoint):
+    path = os.path.join(store_dir, CHECKPOINT_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+def ingest_directory(root: str, embedder, faiss_index, workers: int = None, embed_batch_size: int = 1024,
+                     checkpoint_every: int = 200, tenant: str = None, max_tokens: int = CHUNK_MAX_TOKENS,
+                     overlap_tokens: int = CHUNK_OVERLAP_TOKENS, progress_every: float = 10.0):
+    """
+    Indexes every .txt/.pdf/.docx file under root into faiss_index, resumably.
+
+    Files are hashed, extracted and chunked in a process pool, and their chunks are embedded
+    and added embed_batch_size at a time, across file boundaries. Each file becomes one
+    document with its content_hash and source_path in the metadata. Files whose contents are
+    already indexed (under any path) are skipped, and a file whose contents changed replaces
+    the document previously indexed from its path.
+
+    Every checkpoint_every files, all pending chunks are added and the index is saved, so
+    the saved index only ever holds whole files. After a crash, a rerun skips everything up
+    to the last checkpoint by hash and carries on from there.
+
+    Returns:
+        A dict of counts: files seen, indexed, unchanged, empty, failed, and chunks added.
+    """
+    root = os.path.abspath(root)
+    store_dir = faiss_index.store_dir
+    checkpoint = _load_checkpoint(store_dir) if store_dir else {"empty": {}}
+    known = {meta["content_hash"]: doc_id for doc_id, meta in faiss_index.documents.items() if meta.get("content_hash")}
+    by_path = {meta["source_path"]: doc_id for doc_id, meta in faiss_index.documents.items() if meta.get("source_path")}
+    stats = {"files": 0, "indexed": 0, "unchanged": 0, "empty": 0, "failed": 0, "chunks": 0}
+    max_tokens = min(max_tokens, embedder.max_tokens)
+    workers = workers or os.cpu_count() or 1
+
+    pending_texts, pending_docs = [], [] # Chunks not yet embedded, and (doc_id, replaced doc_id) of their files
+    since_checkpoint = 0
+
+    def flush():
+        for start in range(0, len(pending_texts), embed_batch_size):
+            batch = pending_texts[start:start + embed_batch_size]
+            embeddings = embedder.get_embeddings([text for _, text in batch])
+            for doc_id, (texts, vectors) in _group_by_doc(batch, embeddings):
+                faiss_index.add_batch(vectors, texts, doc_id=doc_id)
+        for doc_id, replaced in pending_docs:
+            if replaced in faiss_index.documents: # A changed file replaces its earlier version
+                faiss_index.remove_document(replaced)
+        stats["chunks"] += len(pending_texts)
+        pending_texts.clear()
+        pending_docs.clear()
+
+    def save_checkpoint():
+        flush()
+        if store_dir:
+            faiss_index.save()
+            _save_checkpoint(store_dir, checkpoint)
+
+    started = last_report = time.perf_counter()
+    initargs = (embedder.tokenizer, max_tokens, overlap_tokens, frozenset(known).union(checkpoint["empty"]))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        in_flight = deque()
+        paths = iter_files(root)
+        while True:
+            while len(in_flight) < 4 * workers: # Bounded, so 100k files never sit in memory at once
+                path = next(paths, None)
+                if path is None:
+                    break
+                in_flight.append(pool.submit(_extract_and_chunk, path))
+            if not in_flight:
+                break
+            path, content_hash, chunks, error = in_flight.popleft().result()
+            stats["files"] += 1
+            if error is not None:
+                stats["failed"] += 1
+                print(f"Error ingesting {path}: {error}")
+            elif chunks is None or content_hash in known:
+                stats["unchanged"] += 1
+            elif not chunks:
+                stats["empty"] += 1
+                checkpoint["empty"][content_hash] = path
+            else:
+                doc_id = faiss_index.new_document(os.path.basename(path), tenant=tenant,
+                                                  source_path=path, content_hash=content_hash)
+                known[content_hash] = doc_id
+                pending_texts.extend((doc_id, text) for text in chunks)
+                pending_docs.append((doc_id, by_path.get(path)))
+                by_path[path] = doc_id
+                stats["indexed"] += 1
+                if len(pending_texts) >= embed_batch_size:
+                    flush()
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                save_checkpoint()
+                since_checkpoint = 0
+            if time.perf_counter() - last_report >= progress_every:
+                last_report = time.perf_counter()
+                elapsed = last_report - started
+                print(f"{stats['files']} files ({stats['files'] / elapsed:.1f}/s), {stats['indexed']} indexed, "
+                      f"{stats['unchanged']} unchanged, {stats['failed']} failed, {stats['chunks']} chunks")
+    save_checkpoint()
+    return stats
+
+def _group_by_doc(batch, embeddings):
+    """Splits a batch of (doc_id, text) and its embeddings into per-document runs, in order."""
+    start = 0
+    for end in range(1, len(batch) + 1):
+        if end == len(batch) or batch[end][0] != batch[start][0]:
+            yield batch[start][0], ([text for _, text in batch[start:end]], embeddings[start:end])
+            start = end
@@ -1,18 +1,138 @@
-def split_text(text: str, max_tokens: int = 500):
-    import re
-    # Split by sentences for natural chunks
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-    chunks = []
-    current_chunk = ""
-
-    for sentence in sentences:
-        if len(current_chunk.split()) + len(sentence.split()) <= max_tokens:
-            current_chunk += " " + sentence
+import re
+from collections import deque, namedtuple
+
+from app.core import metrics
+
+# A chunk of source text; text == source[start:end], where the source of a segment stream
+# is the segments joined with '\n' (as extract_text_from_raw returns them)
+Chunk = namedtuple("Chunk", ["text", "start", "end"])
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\S+')
+MAX_CARRY_CHARS = 64 * 1024 # Flush unpunctuated text at a space once the carry gets this long
+TOKENIZE_BATCH = 256        # Sentences counted per tokenizer call
+
+def _iter_pieces(segments):
+    """
+    Yields (piece, start) pairs, where each piece is a sentence plus its trailing whitespace,
+    so the pieces concatenate back to the source text exactly.
+    """
+    carry, carry_start = "", 0
+    for i, segment in enumerate(segments):
+        text = carry + ("\n" if i else "") + segment
+        last = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            yield text[last:match.end()], carry_start + last
+            last = match.end()
+        carry_start += last
+        carry = text[last:]
+        if len(carry) > MAX_CARRY_CHARS:
+            cut = carry.rfind(" ") + 1
+            if cut > 0:
+                yield carry[:cut], carry_start
+                carry_start += cut
+                carry = carry[cut:]
+    if carry:
+        yield carry, carry_start
+
+def _split_long(piece: str, start: int, max_tokens: int, tokenizer):
+    """Cuts a piece longer than max_tokens at token (or, without a fast tokenizer, word) boundaries."""
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        offsets = tokenizer(piece, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        cuts = [offsets[i][0] for i in range(max_tokens, len(offsets), max_tokens)]
+        sizes = [max_tokens] * len(cuts) + [len(offsets) - max_tokens * len(cuts)]
+    else:
+        words = [m.start() for m in _WORD.finditer(piece)]
+        step = max_tokens if tokenizer is None else max(1, max_tokens // 2) # Words are ~1.3 tokens
+        cuts = words[step::step]
+        sizes = [step] * len(cuts) + [len(words) - step * len(cuts)]
+    bounds = [0] + cuts + [len(piece)]
+    for (lo, hi), size in zip(zip(bounds, bounds[1:]), sizes):
+        yield piece[lo:hi], start + lo, size
+
+def _iter_counted_pieces(segments, tokenizer, max_tokens: int):
+    """Yields (piece, start, token_count) with every count <= max_tokens. Each piece is tokenized once."""
+    batch = []
+    for piece, start in _iter_pieces(segments):
+        batch.append((piece, start))
+        if len(batch) == TOKENIZE_BATCH:
+            yield from _count_batch(batch, tokenizer, max_tokens)
+            batch = []
+    if batch:
+        yield from _count_batch(batch, tokenizer, max_tokens)
+
+def _count_batch(batch, tokenizer, max_tokens: int):
+    if tokenizer is None:
+        counts = [len(piece.split()) for piece, _ in batch]
+    else:
+        encoded = tokenizer([piece for piece, _ in batch], add_special_tokens=False)["input_ids"]
+        counts = [len(ids) for ids in encoded]
+    for (piece, start), count in zip(batch, counts):
+        if count > max_tokens:
+            yield from _split_long(piece, start, max_tokens, tokenizer)
         else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence
+            yield piece, start, count
+
+def _make_chunk(window):
+    text = "".join(piece for piece, _, _ in window)
+    stripped = text.strip()
+    if not stripped:
+        return None
+    start = window[0][1] + (len(text) - len(text.lstrip()))
+    return Chunk(stripped, start, start + len(stripped))
+
+def iter_chunks(source, tokenizer=None, max_tokens: int = 500, overlap_tokens: int = 0):
+    """
+    Splits text into chunks of whole sentences holding at most max_tokens tokens each.
+
+    Runs in a single pass with a running token count: every sentence is tokenized once
+    (in batches) and kept in a sliding window until its chunk is emitted.
+
+    Args:
+        source: A string, or an iterable of text segments (e.g. from iter_text_from_raw)
+            that is consumed lazily.
+        tokenizer: A Hugging Face tokenizer to count tokens with, e.g. EmbeddingModel.tokenizer.
+            Without one, whitespace-separated words are counted.
+        max_tokens: Token budget per chunk, excluding special tokens. Sentences longer than
+            this are cut at token boundaries, so nothing is silently truncated later.
+        overlap_tokens: Up to this many tokens of trailing sentences from each chunk are
+            repeated at the start of the next one.
+
+    Yields:
+        Chunk(text, start, end) tuples with character offsets into the source.
+        Time spent chunking (not extracting the source) is recorded as the "chunk" stage.
+    """
+    return metrics.timed_iter(_iter_chunks(source, tokenizer, max_tokens, overlap_tokens), "chunk")
+
+def _iter_chunks(source, tokenizer, max_tokens: int, overlap_tokens: int):
+    if isinstance(source, str):
+        source = [source]
+    window = deque()
+    window_tokens = 0
+    has_new = False # Whether the window holds anything not yet emitted
+    for piece, start, count in _iter_counted_pieces(source, tokenizer, max_tokens):
+        if window_tokens + count > max_tokens:
+            if has_new:
+                chunk = _make_chunk(window)
+                if chunk:
+                    metrics.inc("docqa_chunks_total")
+                    yield chunk
+                has_new = False
+            while window and (window_tokens > overlap_tokens or window_tokens + count > max_tokens):
+                window_tokens -= window.popleft()[2]
+        window.append((piece, start, count))
+        window_tokens += count
+        has_new = has_new or bool(piece.strip())
+    if has_new:
+        chunk = _make_chunk(window)
+        if chunk:
+            metrics.inc("docqa_chunks_total")
+            yield chunk
 
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+def split_text(text: str, max_tokens: int = 500, tokenizer=None, overlap_tokens: int = 0):
+    return [chunk.text for chunk in iter_chunks(text, tokenizer, max_tokens, overlap_tokens)]
 
-    return chunks
+def split_text_stream(segments, max_tokens: int = 500, tokenizer=None, overlap_tokens: int = 0):
+    """Streaming counterpart of split_text over an iterable of text segments; yields chunk texts."""
+    for chunk in iter_chunks(segments, tokenizer, max_tokens, overlap_tokens):
+        yield chunk.text
@@ -1,10 +1,109 @@
 # File: app/utils/file_reader.py
 
+import codecs
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber # Make sure pdfplumber is installed: pip install pdfplumber
 from docx import Document # Make sure python-docx is installed: pip install python-docx
 import traceback
 
+from app.core import metrics
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+PDF_PAGES_PER_TASK = 16       # Pages one worker process extracts per task
+DOCX_PARAGRAPHS_PER_SEGMENT = 200
+TXT_BYTES_PER_SEGMENT = 1 << 20
+
+def _clean(text: str) -> str:
+    """Strips each line and drops empty ones."""
+    return '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int):
+    """Extracts and cleans pages [start, stop) of a PDF. Runs in a worker process."""
+    texts = []
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            texts.append(_clean(page.extract_text() or ""))
+            page.close() # Drop pdfplumber's per-page object cache
+    return texts
+
+def _iter_pdf(file_path: str, workers: int = None):
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+
+    if page_count <= PDF_PAGES_PER_TASK or workers == 1:
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            yield from _extract_pdf_pages(file_path, start, min(start + PDF_PAGES_PER_TASK, page_count))
+        return
+
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Keep at most two tasks per worker in flight and yield results in page order
+        pending = deque()
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            pending.append(pool.submit(_extract_pdf_pages, file_path, start, min(start + PDF_PAGES_PER_TASK, page_count)))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _iter_docx(file_path: str):
+    document = Document(file_path)
+    paragraphs = document.paragraphs
+    for start in range(0, len(paragraphs), DOCX_PARAGRAPHS_PER_SEGMENT):
+        yield _clean('\n'.join(p.text for p in paragraphs[start:start + DOCX_PARAGRAPHS_PER_SEGMENT]))
+
+def _detect_text_encoding(file_path: str) -> str:
+    """Returns 'utf-8' if the whole file decodes as UTF-8, else 'latin-1'. Reads in blocks."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        with open(file_path, 'rb') as f:
+            while block := f.read(TXT_BYTES_PER_SEGMENT):
+                decoder.decode(block)
+            decoder.decode(b'', final=True)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def _iter_txt(file_path: str):
+    encoding = _detect_text_encoding(file_path)
+    if encoding != 'utf-8':
+        print(f"Warning: UTF-8 decoding failed for {os.path.basename(file_path)}. Trying 'latin-1'.")
+    with open(file_path, 'r', encoding=encoding) as txt_file:
+        while lines := txt_file.readlines(TXT_BYTES_PER_SEGMENT):
+            yield _clean(''.join(lines))
+
+def iter_text_from_raw(file_path: str, ext: str, workers: int = None):
+    """
+    Streams the text of a file as cleaned segments (PDF pages, DOCX paragraph ranges or
+    ~1 MB blocks of a text file), in document order, so callers never hold the whole text.
+
+    PDF pages are extracted in a process pool of `workers` processes (default: one per CPU)
+    with a bounded number of tasks in flight. python-docx has to parse the whole document
+    up front, so DOCX paragraph ranges are produced in-process.
+    Empty segments are skipped; joining the segments with '\\n' gives extract_text_from_raw's result.
+    Time spent extracting is recorded as the "extract" stage.
+
+    Raises:
+        ValueError: For unsupported extensions. I/O and parser errors propagate.
+    """
+    if ext == '.pdf':
+        segments = _iter_pdf(file_path, workers)
+    elif ext == '.docx':
+        segments = _iter_docx(file_path)
+    elif ext == '.txt':
+        segments = _iter_txt(file_path)
+    else:
+        raise ValueError(f"Unsupported file extension '{ext}'")
+    for segment in metrics.timed_iter(segments, "extract"):
+        if segment:
+            metrics.inc("docqa_extracted_chars_total", len(segment))
+            yield segment
+
 def extract_text_from_raw(file_path: str, ext: str) -> str:
     """
     Reads a file from the given path and extracts text content based on its extension.
@@ -21,35 +120,9 @@ def extract_text_from_raw(file_path: str, ext: str) -> str:
     print(f"Attempting to extract text from: {file_basename} (type: {ext})")
 
     try:
-        if ext == '.pdf':
-            # Use pdfplumber directly with the file path
-            with pdfplumber.open(file_path) as pdf:
-                all_pages_text = [page.extract_text() or "" for page in pdf.pages]
-                text = "\n".join(all_pages_text)
-            print(f"Extracted {len(text)} characters from PDF: {file_basename}")
-
-        elif ext == '.docx':
-            # Use python-docx directly with the file path
-            document = Document(file_path)
-            all_paras_text = [p.text for p in document.paragraphs]
-            text = "\n".join(all_paras_text)
-            print(f"Extracted {len(text)} characters from DOCX: {file_basename}")
-
-        elif ext == '.txt':
-            # Try reading with utf-8, fallback to latin-1
-            try:
-                with open(file_path, 'r', encoding='utf-8') as txt_file:
-                    text = txt_file.read()
-            except UnicodeDecodeError:
-                print(f"Warning: UTF-8 decoding failed for {file_basename}. Trying 'latin-1'.")
-                try:
-                    with open(file_path, 'r', encoding='latin-1') as txt_file:
-                         text = txt_file.read()
-                except Exception as e_enc:
-                     print(f"Error reading text file {file_basename} with fallback encoding: {e_enc}")
-                     text = "" # Ensure text is empty on failure
-            print(f"Extracted {len(text)} characters from TXT: {file_basename}")
-
+        if ext in SUPPORTED_EXTENSIONS:
+            text = '\n'.join(iter_text_from_raw(file_path, ext))
+            print(f"Extracted {len(text)} characters from {ext.lstrip('.').upper()}: {file_basename}")
         else:
             print(f"Warning: Unsupported file extension '{ext}' for file: {file_basename}")
             text = "" # Return empty string for unsupported types
@@ -63,12 +136,7 @@ def extract_text_from_raw(file_path: str, ext: str) -> str:
         traceback.print_exc()
         text = "" # Return empty string on error
 
-    # Basic cleanup (optional) - remove extra whitespace
-    if text:
-        cleaned_lines = [line.strip() for line in text.splitlines() if line.strip()]
-        text = '\n'.join(cleaned_lines)
-
     if not text:
          print(f"Warning: No text could be extracted from {file_basename}")
 
-    return text
\ No newline at end of file
+    return text
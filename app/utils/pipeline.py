@@ -0,0 +1,89 @@
+# File: app/utils/pipeline.py
+
+import copy
+import queue
+import threading
+import traceback
+
+from app.utils.file_reader import iter_text_from_raw
+from app.utils.chunker import split_text_stream
+
+_DONE = object()
+CHUNK_MAX_TOKENS = 500
+CHUNK_OVERLAP_TOKENS = 50
+
+def iter_in_background(iterable, max_buffered: int):
+    """
+    Runs `iterable` on a daemon thread and yields its items through a queue of at most
+    max_buffered items, so the producer runs ahead of the consumer by a bounded amount.
+    Exceptions raised by the producer are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                items.put(item)
+            items.put(_DONE)
+        except BaseException as e:
+            items.put(e)
+
+    threading.Thread(target=produce, daemon=True, name="ingest-producer").start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        while not items.empty(): # Unblock a producer waiting on a full queue
+            items.get_nowait()
+
+def _batched(iterable, size: int):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def ingest_file(file_path: str, ext: str, embedder, faiss_index, batch_size: int = 128,
+                max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                workers: int = None, doc_id: str = None) -> int:
+    """
+    Extracts, chunks, embeds and indexes one file as a stream.
+
+    Extraction (PDF pages in a process pool) and chunking run on a background thread and
+    hand chunks over through a bounded buffer, while this thread embeds and indexes them
+    batch_size at a time. Embedding therefore starts with the first pages, and memory stays
+    bounded by the buffers rather than growing with the file. Chunks are sized with the
+    embedder's own tokenizer and capped at what the model embeds without truncation.
+    With doc_id (from faiss_index.new_document), the chunks are attributed to that document.
+
+    Returns:
+        The number of chunks indexed.
+    """
+    segments = iter_text_from_raw(file_path, ext, workers=workers)
+    max_tokens = min(max_tokens, embedder.max_tokens)
+    tokenizer = copy.deepcopy(embedder.tokenizer) # Fast tokenizers must not be shared across threads
+    chunks = split_text_stream(segments, max_tokens, tokenizer, overlap_tokens)
+    chunks = iter_in_background(chunks, max_buffered=2 * batch_size)
+    count = 0
+    try:
+        for batch in _batched(chunks, batch_size):
+            embeddings = embedder.get_embeddings(batch)
+            faiss_index.add_batch(embeddings, batch, doc_id=doc_id)
+            count += len(batch)
+    except Exception as e:
+        print(f"Error during streaming ingestion after {count} chunks: {e}")
+        print(traceback.format_exc())
+        raise
+    return count
@@ -0,0 +1,135 @@
+# File: benchmarks/bench_ann.py
+"""
+Recall@k vs. per-query latency of the FaissIndex ANN modes against the exact flat baseline.
+
+Vectors are drawn from a Gaussian mixture so neighbourhoods look more like sentence
+embeddings than uniform noise. Queries are run one at a time, as /query does.
+
+Usage:
+    python -m benchmarks.bench_ann --vectors 100000 --dim 384 --output benchmarks/results/ann_report.md
+"""
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from app.core.faiss_wrapper import RERANK_FACTOR, RERANK_MIN_CANDIDATES, build_index
+
+SWEEPS = {
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "ivf_pq": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("efSearch", [16, 32, 64, 128]),
+}
+
+
+def clustered_vectors(rng, count, dim, centers):
+    means = rng.standard_normal((centers, dim)).astype(np.float32)
+    labels = rng.integers(0, centers, size=count)
+    return means[labels] + rng.standard_normal((count, dim)).astype(np.float32)
+
+
+def search_one_by_one(index, queries, k, params=None):
+    """Returns (ids, mean latency in ms) for single-query searches."""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, ids[i:i + 1] = index.search(queries[i:i + 1], k, params=params)
+    return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def search_reranked(index, queries, vectors, k, params=None):
+    """Like search_one_by_one, re-ranking k * RERANK_FACTOR candidates by exact distance (as FaissIndex does for IVF-PQ)."""
+    ids = np.full((len(queries), k), -1, dtype=np.int64) # -1 pads queries with fewer than k candidates
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        _, candidates = index.search(queries[i:i + 1], max(k * RERANK_FACTOR, RERANK_MIN_CANDIDATES), params=params)
+        candidates = candidates[0][candidates[0] >= 0]
+        best = candidates[np.argsort(((vectors[candidates] - queries[i]) ** 2).sum(axis=1))[:k]]
+        ids[i, :len(best)] = best
+    return ids, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads")
+    parser.add_argument("--output", help="Write a Markdown report here")
+    parser.add_argument("--json", help="Write raw results as JSON here")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    data = clustered_vectors(rng, args.vectors + args.queries, args.dim, centers=max(10, args.vectors // 100))
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+
+    rows = []
+    flat = build_index("flat", args.dim, args.vectors)
+    flat.add(vectors)
+    truth, flat_ms = search_one_by_one(flat, queries, args.k)
+    rows.append({"index_type": "flat", "param": "-", "value": None, "build_s": 0.0,
+                 "recall": 1.0, "latency_ms": flat_ms})
+    print(f"flat: {flat_ms:.3f} ms/query")
+
+    for index_type, (param, values) in SWEEPS.items():
+        start = time.perf_counter()
+        index = build_index(index_type, args.dim, args.vectors)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        for value in values:
+            if param == "nprobe":
+                params = faiss.SearchParametersIVF(nprobe=value)
+            else:
+                params = faiss.SearchParametersHNSW(efSearch=value)
+            found, ms = search_one_by_one(index, queries, args.k, params)
+            row = {"index_type": index_type, "param": param, "value": value, "build_s": build_s,
+                   "recall": recall_at_k(found, truth), "latency_ms": ms}
+            rows.append(row)
+            print(f"{index_type} {param}={value}: recall@{args.k}={row['recall']:.3f}, {ms:.3f} ms/query")
+        if index_type == "ivf_pq":
+            for value in values:
+                found, ms = search_reranked(index, queries, vectors, args.k, faiss.SearchParametersIVF(nprobe=value))
+                row = {"index_type": f"ivf_pq + re-rank x{RERANK_FACTOR}", "param": param, "value": value,
+                       "build_s": build_s, "recall": recall_at_k(found, truth), "latency_ms": ms}
+                rows.append(row)
+                print(f"{row['index_type']} {param}={value}: recall@{args.k}={row['recall']:.3f}, {ms:.3f} ms/query")
+
+    lines = [
+        f"# ANN recall@{args.k} vs latency",
+        "",
+        f"{args.vectors:,} clustered vectors, dim {args.dim}, {args.queries} single-vector queries, "
+        f"{args.threads} FAISS thread(s). Generated by `python -m benchmarks.bench_ann`.",
+        "",
+        f"| Index | Search param | Recall@{args.k} | Latency (ms/query) | Speedup vs flat | Build (s) |",
+        "|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        setting = "-" if row["value"] is None else f"{row['param']}={row['value']}"
+        lines.append(f"| {row['index_type']} | {setting} | {row['recall']:.3f} | {row['latency_ms']:.3f} | "
+                     f"{flat_ms / row['latency_ms']:.1f}x | {row['build_s']:.1f} |")
+    report = "\n".join(lines) + "\n"
+    print()
+    print(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# File: benchmarks/bench_chunker.py
+"""
+Chunking throughput on multi-megabyte synthetic text: the original split_text loop
+against the single-pass chunker, with word counts and (optionally) tokenizer counts.
+
+Usage:
+    python -m benchmarks.bench_chunker --sizes-mb 1 4 16 --tokenizer sentence-transformers/paraphrase-MiniLM-L3-v2
+"""
+
+import argparse
+import random
+import re
+import time
+
+from app.utils.chunker import iter_chunks
+from benchmarks.corpus import synthetic_sentence
+
+
+def legacy_split_text(text: str, max_tokens: int = 500):
+    """split_text as it was before the single-pass chunker, kept as the baseline."""
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk.split()) + len(sentence.split()) <= max_tokens:
+            current_chunk += " " + sentence
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def synthetic_text(size_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, total = [], 0
+    while total < size_bytes:
+        sentence = synthetic_sentence(rng) + ("\n" if rng.random() < 0.2 else " ")
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer name or path for token-aware counting")
+    args = parser.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+    for size_mb in args.sizes_mb:
+        text = synthetic_text(int(size_mb * 1024 * 1024))
+        mb = len(text.encode("utf-8")) / (1024 * 1024)
+        print(f"--- {mb:.1f} MB ---")
+
+        legacy, seconds = timed(lambda: legacy_split_text(text, args.max_tokens))
+        print(f"legacy split_text:      {seconds:7.2f}s {mb / seconds:7.2f} MB/s  {len(legacy)} chunks")
+        if tokenizer is not None:
+            over = sum(len(tokenizer(c, add_special_tokens=False)["input_ids"]) > args.max_tokens for c in legacy)
+            print(f"  legacy chunks over {args.max_tokens} tokens: {over}")
+
+        chunks, seconds = timed(lambda: list(iter_chunks(text, None, args.max_tokens, args.overlap)))
+        print(f"iter_chunks (words):    {seconds:7.2f}s {mb / seconds:7.2f} MB/s  {len(chunks)} chunks")
+
+        if tokenizer is not None:
+            chunks, seconds = timed(lambda: list(iter_chunks(text, tokenizer, args.max_tokens, args.overlap)))
+            print(f"iter_chunks (tokenizer):{seconds:7.2f}s {mb / seconds:7.2f} MB/s  {len(chunks)} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# File: benchmarks/bench_e2e.py
+"""
+End-to-end ingestion and query benchmark on synthetic corpora, offline and on CPU.
+
+For every corpus size it measures, in a fresh process (so peak RSS is per size):
+  - ingestion throughput per stage (extraction, chunking, embedding, indexing, saving),
+    run one stage after another so each is timed on its own,
+  - the pipelined ingest_file path the UI uses, end to end,
+  - query latency p50/p95/p99 per stage (embedding, search, context packing, generation) and in total,
+  - peak RSS.
+
+By default the embedding model and the LLM are stubs (benchmarks/stubs.py), which time the
+app's own code; --embedder and --llm switch in the real models. Results are written as
+JSON so runs can be compared across commits.
+
+Usage:
+    python -m benchmarks.bench_e2e --sizes 64KB 1MB 16MB --json benchmarks/results/e2e.json
+    python -m benchmarks.bench_e2e --sizes 256MB --queries 500
+    python -m benchmarks.bench_e2e --sizes 1MB --embedder sentence-transformers/paraphrase-MiniLM-L3-v2 --llm
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "B": 1}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024 # Bytes on macOS, KB on Linux
+
+
+def latency_summary(seconds):
+    ms = np.asarray(seconds) * 1000
+    return {"p50_ms": float(np.percentile(ms, 50)), "p95_ms": float(np.percentile(ms, 95)),
+            "p99_ms": float(np.percentile(ms, 99)), "mean_ms": float(ms.mean()), "count": int(len(ms))}
+
+
+class TimedIter:
+    """Wraps an iterator and adds the time spent producing each item to .seconds."""
+
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        self.seconds = 0.0
+        self.items = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            item = next(self._it)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.items += 1
+        return item
+
+
+def load_models(args):
+    if args.embedder:
+        from app.core.embedding_model import EmbeddingModel
+        embedder = EmbeddingModel(model_name=args.embedder, batch_size=args.embed_batch_size).warm_up()
+    else:
+        from benchmarks.stubs import StubEmbedder
+        embedder = StubEmbedder(args.dim)
+    if args.llm:
+        from app.core.llm import load_llm
+        llm = load_llm()
+    else:
+        from benchmarks.stubs import StubLlama
+        llm = StubLlama(args.stub_token_ms)
+    return embedder, llm
+
+
+def bench_stages(path: str, size_bytes: int, embedder, store_dir: str, args):
+    """Runs extraction -> chunking -> embedding -> indexing -> save serially, timing each stage."""
+    from app.core.faiss_wrapper import FaissIndex
+    from app.utils.chunker import iter_chunks
+    from app.utils.file_reader import iter_text_from_raw
+
+    index = FaissIndex(embedder.dimension, store_dir=store_dir, index_type=args.index_type)
+    segments = TimedIter(iter_text_from_raw(path, ".txt"))
+    chunks = TimedIter(iter_chunks(segments, embedder.tokenizer, min(args.max_tokens, embedder.max_tokens), args.overlap))
+    embed_seconds = index_seconds = 0.0
+    batch = []
+
+    def flush(batch):
+        nonlocal embed_seconds, index_seconds
+        start = time.perf_counter()
+        embeddings = embedder.get_embeddings(batch)
+        embedded = time.perf_counter()
+        index.add_batch(embeddings, batch)
+        embed_seconds += embedded - start
+        index_seconds += time.perf_counter() - embedded
+
+    for chunk in chunks:
+        batch.append(chunk.text)
+        if len(batch) == args.batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    start = time.perf_counter()
+    index.wait_for_rebuild() # Part of indexing, even when it ran in the background
+    index_seconds += time.perf_counter() - start
+    start = time.perf_counter()
+    index.save()
+    save_seconds = time.perf_counter() - start
+
+    mb = size_bytes / (1 << 20)
+    count = chunks.items
+    chunk_seconds = chunks.seconds - segments.seconds # Chunking pulls segments, so take extraction out
+    stages = {
+        "extract": {"seconds": segments.seconds, "mb_per_s": mb / max(segments.seconds, 1e-9), "segments": segments.items},
+        "chunk": {"seconds": chunk_seconds, "mb_per_s": mb / max(chunk_seconds, 1e-9), "chunks": count},
+        "embed": {"seconds": embed_seconds, "chunks_per_s": count / max(embed_seconds, 1e-9)},
+        "index": {"seconds": index_seconds, "chunks_per_s": count / max(index_seconds, 1e-9)},
+        "save": {"seconds": save_seconds},
+    }
+    return stages, index
+
+
+def bench_pipeline(path: str, size_bytes: int, embedder, store_dir: str, args):
+    """Times ingest_file, where extraction and chunking overlap embedding and indexing."""
+    from app.core.faiss_wrapper import FaissIndex
+    from app.utils.pipeline import ingest_file
+
+    index = FaissIndex(embedder.dimension, store_dir=store_dir, index_type=args.index_type)
+    start = time.perf_counter()
+    count = ingest_file(path, ".txt", embedder, index, batch_size=args.batch_size,
+                        max_tokens=args.max_tokens, overlap_tokens=args.overlap)
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "chunks": count, "mb_per_s": size_bytes / (1 << 20) / max(seconds, 1e-9),
+            "chunks_per_s": count / max(seconds, 1e-9)}
+
+
+def bench_queries(index, embedder, llm, args):
+    """Answers synthetic questions one at a time and returns per-stage latency percentiles."""
+    from app.core.context_packer import context_budget, pack_context
+    from app.core.llm import MAX_ANSWER_TOKENS, N_CTX, count_tokens, generate_answer
+    from benchmarks.corpus import synthetic_sentence
+
+    template = "Answer the question based on the context below.\n\nContext:\n{context}\n\nQuestion: {question}"
+    rng = random.Random(1)
+    questions = [synthetic_sentence(rng, 4, 12).rstrip(".") + "?" for _ in range(args.queries)]
+    timings = {"embed": [], "search": [], "prompt": [], "generate": [], "total": []}
+    for question in questions:
+        t0 = time.perf_counter()
+        query_embedding = embedder.get_embedding(question)
+        t1 = time.perf_counter()
+        top_chunks = index.search(query_embedding, top_k=args.top_k)
+        t2 = time.perf_counter()
+        # Same packing as main.build_prompt
+        budget = context_budget(template.format(context="", question=question), count_tokens,
+                                N_CTX, MAX_ANSWER_TOKENS, args.context_tokens)
+        context = pack_context(query_embedding, top_chunks, embedder, count_tokens, budget)
+        prompt = template.format(context=context, question=question)
+        t3 = time.perf_counter()
+        generate_answer(prompt, llm)
+        t4 = time.perf_counter()
+        for stage, seconds in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t4 - t0)):
+            timings[stage].append(seconds)
+    return {stage: latency_summary(values) for stage, values in timings.items()}
+
+
+def run_one(size_bytes: int, args):
+    """Benchmarks one corpus size in this process and returns the result record."""
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_", dir=args.workdir)
+    try:
+        from benchmarks.corpus import write_synthetic_text
+        path = os.path.join(workdir, "corpus.txt")
+        size_bytes = write_synthetic_text(path, size_bytes, seed=args.seed)
+        embedder, llm = load_models(args)
+        baseline_rss = peak_rss_mb()
+
+        stages, index = bench_stages(path, size_bytes, embedder, os.path.join(workdir, "stages"), args)
+        pipeline = bench_pipeline(path, size_bytes, embedder, os.path.join(workdir, "pipeline"), args)
+        ingest_rss = peak_rss_mb()
+        queries = bench_queries(index, embedder, llm, args) if args.queries else {}
+        return {
+            "size_bytes": size_bytes,
+            "chunks": stages["chunk"]["chunks"],
+            "ingest": {"stages": stages, "pipeline": pipeline},
+            "query": queries,
+            "memory": {"peak_rss_mb": peak_rss_mb(), "peak_rss_mb_after_ingest": ingest_rss,
+                       "peak_rss_mb_after_model_load": baseline_rss},
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment():
+    import faiss
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "faiss": faiss.__version__,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["64KB", "1MB", "16MB"], help="Corpus sizes, e.g. 64KB 1MB 256MB")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5, help="Chunks the context is packed from")
+    parser.add_argument("--context-tokens", type=int, default=768, help="Context token budget per prompt")
+    parser.add_argument("--batch-size", type=int, default=128, help="Chunks embedded and indexed per batch")
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--index-type", default="auto")
+    parser.add_argument("--dim", type=int, default=384, help="Stub embedding dimension")
+    parser.add_argument("--embedder", help="Real embedding model name or path instead of the stub")
+    parser.add_argument("--embed-batch-size", type=int, default=32)
+    parser.add_argument("--llm", action="store_true", help="Use the real phi-2 model instead of the stub")
+    parser.add_argument("--stub-token-ms", type=float, default=0.0, help="Simulated stub LLM time per token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where corpora and indexes are written (default: system temp)")
+    parser.add_argument("--json", help="Write the results as JSON here (default: print them)")
+    parser.add_argument("--in-process", action="store_true", help="Run every size in this process (shared peak RSS)")
+    parser.add_argument("--worker-result", help=argparse.SUPPRESS) # Internal: run --sizes[0], write JSON here
+    args = parser.parse_args()
+
+    if args.worker_result:
+        with open(args.worker_result, "w") as f:
+            json.dump(run_one(parse_size(args.sizes[0]), args), f)
+        return
+
+    runs = []
+    for size in args.sizes:
+        print(f"--- {size} ---", file=sys.stderr)
+        if args.in_process:
+            runs.append(run_one(parse_size(size), args))
+            continue
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            result_path = f.name
+        try:
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_e2e", *sys.argv[1:], "--sizes", size,
+                            "--worker-result", result_path], check=True, stdout=sys.stderr)
+            with open(result_path) as f:
+                runs.append(json.load(f))
+        finally:
+            os.remove(result_path)
+
+    report = {"environment": environment(), "config": vars(args), "runs": runs}
+    for run in runs:
+        stages, query = run["ingest"]["stages"], run["query"]
+        print(f"{run['size_bytes'] / (1 << 20):9.2f} MB  {run['chunks']:7d} chunks  "
+              f"extract {stages['extract']['mb_per_s']:7.1f} MB/s  chunk {stages['chunk']['mb_per_s']:6.1f} MB/s  "
+              f"embed {stages['embed']['chunks_per_s']:8.0f}/s  index {stages['index']['chunks_per_s']:8.0f}/s  "
+              f"pipeline {run['ingest']['pipeline']['mb_per_s']:6.1f} MB/s  "
+              + (f"query p50/p95/p99 {query['total']['p50_ms']:.1f}/{query['total']['p95_ms']:.1f}/"
+                 f"{query['total']['p99_ms']:.1f} ms  " if query else "")
+              + f"peak RSS {run['memory']['peak_rss_mb']:.0f} MB", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
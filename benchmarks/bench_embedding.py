@@ -0,0 +1,44 @@
+# File: benchmarks/bench_embedding.py
+"""
+Compares per-chunk embedding (the old upload loop) against batched embedding.
+
+Usage:
+    python -m benchmarks.bench_embedding --chunks 256 --batch-size 32
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.core.embedding_model import EmbeddingModel
+from benchmarks.corpus import synthetic_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--chunks", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    model = EmbeddingModel(model_name=args.model, batch_size=args.batch_size)
+    chunks = synthetic_chunks(args.chunks)
+    model.get_embeddings(chunks[:4])  # Warm up
+
+    start = time.perf_counter()
+    looped = np.stack([model.get_embedding(chunk) for chunk in chunks])
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = model.get_embeddings(chunks)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"Model: {args.model}, chunks: {len(chunks)}, batch size: {args.batch_size}")
+    print(f"Per-chunk loop: {loop_seconds:.2f}s ({len(chunks) / loop_seconds:.1f} chunks/s)")
+    print(f"Batched:        {batch_seconds:.2f}s ({len(chunks) / batch_seconds:.1f} chunks/s)")
+    print(f"Speedup: {loop_seconds / batch_seconds:.2f}x, max abs difference: {np.abs(looped - batched).max():.2e}")
+
+
+if __name__ == "__main__":
+    main()
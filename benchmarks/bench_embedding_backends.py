@@ -0,0 +1,108 @@
+# File: benchmarks/bench_embedding_backends.py
+"""
+Embedding backends compared on CPU: PyTorch, ONNX Runtime (fp32) and ONNX Runtime with
+dynamically int8-quantized weights.
+
+For each backend it reports throughput in chunks/s on synthetic chunk-sized texts and,
+for the ONNX backends, the cosine similarity of every embedding to the PyTorch one.
+The run fails (exit status 1) if any cosine is below --tolerance, so it can gate a
+switch of EMBEDDING_BACKEND.
+
+Usage:
+    python -m benchmarks.bench_embedding_backends
+    python -m benchmarks.bench_embedding_backends --texts 2000 --threads 4 --tolerance 0.99
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.core.embedding_model import BACKENDS, EmbeddingModel
+
+TOLERANCE = 0.99 # Lowest acceptable cosine of an ONNX embedding to the PyTorch one (also used by tests/)
+
+
+def synthetic_texts(count: int, seed: int, min_words: int, max_words: int):
+    from benchmarks.corpus import synthetic_sentence
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = rng.randint(min_words, max_words)
+        text = ""
+        while len(text.split()) < words:
+            text += synthetic_sentence(rng) + " "
+        texts.append(text.strip())
+    return texts
+
+
+def throughput(model: EmbeddingModel, texts, batch_size: int, repeats: int):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embeddings = model.get_embeddings(texts, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return embeddings, len(texts) / best
+
+
+def cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sentence-transformers/paraphrase-MiniLM-L3-v2")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--min-words", type=int, default=20)
+    parser.add_argument("--max-words", type=int, default=250, help="About 500 tokens, the chunker's default limit")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, help="Intra-op threads (default: all cores)")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes per backend; the fastest is reported")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Lowest acceptable cosine to PyTorch")
+    parser.add_argument("--onnx-dir", help="Where ONNX exports are kept (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results as JSON here")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts, args.seed, args.min_words, args.max_words)
+    results, reference, failed = {}, None, False
+    with tempfile.TemporaryDirectory(prefix="bench_onnx_") as tmp:
+        backends = ["torch"] + [b for b in args.backends if b != "torch"] # The reference runs first
+        for backend in backends:
+            started = time.perf_counter()
+            model = EmbeddingModel(model_name=args.model, backend=backend, onnx_dir=args.onnx_dir or tmp,
+                                   num_threads=args.threads).warm_up()
+            load_seconds = time.perf_counter() - started
+            embeddings, rate = throughput(model, texts, args.batch_size, args.repeats)
+            result = {"chunks_per_s": rate, "load_seconds": load_seconds}
+            if reference is None:
+                reference = embeddings
+            else:
+                similarity = cosines(reference, embeddings)
+                result.update(min_cosine=float(similarity.min()), mean_cosine=float(similarity.mean()))
+                failed |= result["min_cosine"] < args.tolerance
+            results[backend] = result
+
+    base = results["torch"]["chunks_per_s"]
+    for backend, result in results.items():
+        line = f"{backend:10s} {result['chunks_per_s']:9.1f} chunks/s  x{result['chunks_per_s'] / base:4.2f}"
+        if "min_cosine" in result:
+            ok = "ok" if result["min_cosine"] >= args.tolerance else f"BELOW {args.tolerance}"
+            line += f"  cosine min {result['min_cosine']:.5f} mean {result['mean_cosine']:.5f} ({ok})"
+        print(line)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
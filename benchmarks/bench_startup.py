@@ -0,0 +1,109 @@
+# File: benchmarks/bench_startup.py
+"""
+Process startup cost: import time of the app modules, and for the API server the time
+from process start until /health answers and until /ready reports all models loaded.
+Every measurement runs in a fresh interpreter, so nothing is already imported or cached.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 3
+    python -m benchmarks.bench_startup --modules main app.core.llm --skip-server
+"""
+
+import argparse
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_MODULES = ["app.core.llm", "app.core.embedding_model", "app.core.faiss_wrapper", "app.core.scheduler", "main"]
+
+
+def import_seconds(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float, process) -> float:
+    """Polls url until it returns 200 and returns the time that happened, or None at the deadline or exit."""
+    while time.perf_counter() < deadline and process.poll() is None:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def server_startup(app: str, timeout: float):
+    """Starts uvicorn on app and returns (seconds to /health, seconds to /ready, last /ready body)."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + timeout
+        healthy = wait_for(base + "/health", deadline, process)
+        ready = wait_for(base + "/ready", deadline, process) if healthy else None
+        try:
+            with urllib.request.urlopen(base + "/ready", timeout=1) as response:
+                body = json.load(response)
+        except urllib.error.HTTPError as e:
+            body = json.load(e)
+        except Exception:
+            body = None
+        return (healthy - started if healthy else None), (ready - started if ready else None), body
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return "timed out"
+    return f"median {statistics.median(values):.2f}s (min {min(values):.2f}s, max {max(values):.2f}s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--app", default="main:app", help="ASGI app for the server measurement")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for /ready")
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    print(f"Import time over {args.runs} fresh interpreter(s):")
+    for module in args.modules:
+        print(f"  {module:28s} {summarize([import_seconds(module) for _ in range(args.runs)])}")
+
+    if args.skip_server:
+        return
+    healthy, ready = [], []
+    for _ in range(args.runs):
+        to_health, to_ready, body = server_startup(args.app, args.timeout)
+        healthy.append(to_health)
+        ready.append(to_ready)
+    print(f"Server {args.app} over {args.runs} start(s):")
+    print(f"  start -> /health: {summarize(healthy)}")
+    print(f"  start -> /ready:  {summarize(ready)}")
+    if body is not None:
+        print(f"  last /ready: {json.dumps(body)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# File: benchmarks/corpus.py
+
+import random
+
+# Vocabulary loosely modelled on the policy documents the app is used with,
+# so sentence and word lengths look like real uploads.
+WORDS = (
+    "the staff must report all incidents to the front office immediately "
+    "visitors should sign in upon arrival and wear a badge at all times "
+    "employees are required to complete mandatory safety training annually "
+    "managers ensure that records are retained according to the data policy "
+    "students may not leave campus without written permission from a guardian "
+    "access to confidential information is restricted to authorised personnel"
+).split()
+
+
+def synthetic_sentence(rng: random.Random, min_words: int = 6, max_words: int = 24) -> str:
+    """Returns one capitalised sentence of random policy-like words."""
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_chunks(count: int, min_words: int = 20, max_words: int = 200, seed: int = 0):
+    """Returns `count` text chunks with word counts spread over [min_words, max_words]."""
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        target = rng.randint(min_words, max_words)
+        words = []
+        while len(words) < target:
+            words.extend(synthetic_sentence(rng).split())
+        chunks.append(" ".join(words[:target]))
+    return chunks
+
+
+def write_synthetic_text(path: str, size_bytes: int, seed: int = 0, block_bytes: int = 1 << 20):
+    """Writes about size_bytes of policy-like sentences (with occasional line breaks) to path, streaming."""
+    rng = random.Random(seed)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < size_bytes:
+            parts, block = [], 0
+            while block < min(block_bytes, size_bytes - written):
+                sentence = synthetic_sentence(rng) + ("\n" if rng.random() < 0.2 else " ")
+                parts.append(sentence)
+                block += len(sentence)
+            f.write("".join(parts))
+            written += block
+    return written
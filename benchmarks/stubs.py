@@ -0,0 +1,54 @@
+# File: benchmarks/stubs.py
+"""
+Offline stand-ins for the embedding model and the LLM, with the interfaces the app uses,
+so the benchmarks time the app's own code paths without downloading or running models.
+"""
+
+import time
+import zlib
+
+import numpy as np
+
+
+class StubEmbedder:
+    """
+    EmbeddingModel look-alike that maps each text to a fixed pseudo-random unit vector
+    (seeded by its CRC32). It has no tokenizer, so chunking falls back to word counts.
+    """
+
+    def __init__(self, dimension: int = 384, max_tokens: int = 510):
+        self.dimension = dimension
+        self.max_tokens = max_tokens
+        self.tokenizer = None
+        self.cache = None
+
+    def get_embedding(self, text: str):
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts, batch_size: int = None, disk_cache: bool = True) -> np.ndarray:
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            embeddings[i] = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+
+
+class StubLlama:
+    """llama_cpp.Llama look-alike returning a canned answer, optionally sleeping per generated token."""
+
+    ANSWER = "Staff must report incidents to the front office immediately."
+
+    def __init__(self, token_ms: float = 0.0):
+        self.token_ms = token_ms
+
+    def __call__(self, prompt, max_tokens=256, stop=None, stream=False, **kwargs):
+        pieces = [" " + word for word in self.ANSWER.split()][:max_tokens]
+        if stream:
+            return self._stream(pieces)
+        time.sleep(self.token_ms * len(pieces) / 1000)
+        return {"choices": [{"text": "".join(pieces)}]}
+
+    def _stream(self, pieces):
+        for piece in pieces:
+            time.sleep(self.token_ms / 1000)
+            yield {"choices": [{"text": piece}]}
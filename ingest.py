@@ -0,0 +1,51 @@
+# File: ingest.py
+"""
+Bulk-indexes a directory tree of .txt/.pdf/.docx files into the vector store that main.py
+and ui.py serve. Extraction and chunking run in a process pool, chunks are embedded in large
+batches, and files whose contents are already indexed are skipped, so an interrupted run
+resumes from its last checkpoint when started again.
+
+A store can only be open in one process, so stop main.py/ui.py first; with remote shard
+servers (INDEX_SHARD_ADDRESSES), ingest.py writes through them while the app keeps serving.
+
+Usage:
+    python ingest.py /data/policies
+    python ingest.py /data/policies --workers 8 --tenant district-12 --checkpoint-every 500
+"""
+
+import argparse
+import os
+import time
+
+from app.core.settings import VECTOR_STORE_DIR, load_embedding_model, open_vector_index
+from app.utils.bulk_ingest import ingest_directory
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("root", help="Directory to index (recursively)")
+    parser.add_argument("--store-dir", default=VECTOR_STORE_DIR)
+    parser.add_argument("--workers", type=int, help="Extraction processes (default: all cores)")
+    parser.add_argument("--embed-batch-size", type=int, default=1024, help="Chunks embedded and indexed per batch")
+    parser.add_argument("--model-batch-size", type=int, default=64, help="Chunks per forward pass of the model")
+    parser.add_argument("--checkpoint-every", type=int, default=200, help="Files between saves of the index")
+    parser.add_argument("--tenant", help="Tenant recorded on every document")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"{args.root} is not a directory")
+    embedder = load_embedding_model(batch_size=args.model_batch_size, warm_up=False)
+    faiss_index = open_vector_index(args.store_dir)
+
+    started = time.perf_counter()
+    stats = ingest_directory(args.root, embedder, faiss_index, workers=args.workers,
+                             embed_batch_size=args.embed_batch_size, checkpoint_every=args.checkpoint_every,
+                             tenant=args.tenant)
+    faiss_index.wait_for_rebuild() # A large ingest may have started one; save the index it builds
+    faiss_index.save()
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f}s: {stats['files']} files, {stats['indexed']} indexed, {stats['unchanged']} unchanged, "
+          f"{stats['empty']} without text, {stats['failed']} failed; {stats['chunks']} chunks added. "
+          f"Index holds {len(faiss_index)} chunks in {len(faiss_index.documents)} documents.")
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,220 @@
-from fastapi import FastAPI, UploadFile, File
-from app.core.embedding_model import EmbeddingModel
-from app.core.faiss_index import FaissIndex
-from app.utils.chunker import split_text
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, Request, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from app.core import metrics
+from app.core.lazy import LazyModel
+from app.core.answer_cache import AnswerCache
+from app.core.context_packer import context_budget, pack_context
+from app.core.llm import MAX_ANSWER_TOKENS, N_CTX, count_tokens, get_llm, load_llm
+from app.core.scheduler import QueryScheduler, QueueFullError
+from app.core.settings import (ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_SIZE, CONTEXT_CANDIDATE_CHUNKS, CONTEXT_MAX_TOKENS,
+                               load_embedding_model, open_vector_index)
+from app.utils.bulk_ingest import file_hash
+from app.utils.file_reader import SUPPORTED_EXTENSIONS
+from app.utils.pipeline import ingest_file
 
+import json
 import os
+import shutil
+import tempfile
+import time
+
+# Scheduler settings; each extra LLM replica costs another copy of the model in RAM
+LLM_REPLICAS = int(os.environ.get("LLM_REPLICAS", "1"))
+LLM_MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", "8"))
+EMBED_BATCH_WINDOW_MS = float(os.environ.get("EMBED_BATCH_WINDOW_MS", "5"))
+
+# Models load in the background once the app starts, so /health answers right away; /ready reports them
+embedding_model = LazyModel("embedding model", load_embedding_model)
+faiss_index = open_vector_index() # Memory-mapped, so cheap
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_SIMILARITY) # Emptied whenever faiss_index.version changes
+scheduler = QueryScheduler(
+    embedding_model,
+    llm_factory=lambda replica: get_llm() if replica == 0 else load_llm(),
+    llm_replicas=LLM_REPLICAS,
+    max_queue=LLM_MAX_QUEUE,
+    embed_wait_ms=EMBED_BATCH_WINDOW_MS,
+)
+
+metrics.register_gauge("docqa_index_chunks", lambda: len(faiss_index), "Chunks in the vector index (removed documents excluded).")
+metrics.register_gauge("docqa_index_documents", lambda: len(faiss_index.documents), "Documents in the vector index.")
+metrics.register_gauge("docqa_generation_queue_depth", lambda: scheduler.generator.queue_depth, "Requests waiting for an LLM replica.")
+metrics.register_gauge("docqa_generation_busy_replicas", lambda: scheduler.generator.busy, "LLM replicas generating an answer.")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    embedding_model.start()
+    await scheduler.start()
+    yield
+    await scheduler.stop()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Load model and index once at startup
-embedding_model = EmbeddingModel()
-faiss_index = FaissIndex(dim=384)  # MiniLM has 384-dim embeddings
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    return JSONResponse(status_code=429, headers={"Retry-After": "1"},
+                        content={"detail": str(exc), "queue_depth": exc.queue_depth})
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    if not metrics.ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route") # Route template, so ids in paths do not create new series
+    metrics.observe("docqa_http_request_seconds", time.perf_counter() - start,
+                    route=route.path if route else "unmatched", method=request.method, status=str(response.status_code))
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text-format metrics: per-stage latency histograms, token counts and rates, index size."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "scheduler": scheduler.stats, "answer_cache": answer_cache.stats}
+
+@app.get("/ready")
+def ready():
+    """200 once the embedding model and at least one LLM replica are loaded, 503 until then."""
+    is_ready = embedding_model.is_loaded and scheduler.generator.ready
+    llm_state = {"loaded_replicas": scheduler.generator.loaded_replicas, "replicas": scheduler.generator.replicas}
+    if scheduler.generator.load_errors:
+        llm_state["errors"] = scheduler.generator.load_errors
+    return JSONResponse(status_code=200 if is_ready else 503,
+                        content={"ready": is_ready, "models": {"embedding_model": embedding_model.status, "llm": llm_state}})
+
+def ingest_upload(path: str, ext: str, filename: str = None, tenant: str = None):
+    """Indexes an uploaded file as a new document; a failed or empty upload leaves nothing behind."""
+    doc_id = faiss_index.new_document(filename, tenant=tenant, content_hash=file_hash(path))
+    try:
+        count = ingest_file(path, ext, embedding_model, faiss_index, doc_id=doc_id)
+        if count == 0:
+            raise ValueError(f"Could not extract readable text from '{filename}'.")
+    except Exception:
+        faiss_index.remove_document(doc_id)
+        raise
+    faiss_index.save()
+    return doc_id, count
 
 @app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    content = await file.read()
-    text = content.decode("utf-8")
+async def upload_document(file: UploadFile = File(...), tenant: Optional[str] = Form(None)):
+    ext = os.path.splitext(file.filename or "")[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        return {"status": "error", "message": f"Unsupported file type '{ext}'; expected one of {', '.join(SUPPORTED_EXTENSIONS)}."}
+    path = None
+    try:
+        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp: # PDF/DOCX readers need a real file
+            path = tmp.name
+            shutil.copyfileobj(file.file, tmp, 1 << 20)
 
-    chunks = split_text(text)
-    for chunk in chunks:
-        emb = embedding_model.get_embedding(chunk)
-        faiss_index.add(emb, chunk)
+        # Extraction, chunking, embedding and index access stay on the embedding thread so they never overlap a search
+        doc_id, count = await scheduler.embedder.run(ingest_upload, path, ext, file.filename, tenant)
 
-    return {"status": "success", "chunks": len(chunks)}
-from fastapi import Request
-from pydantic import BaseModel
-from app.core.llm import generate_answer
+        return {"status": "success", "doc_id": doc_id, "chunks": count, "embedding_cache": embedding_model.cache.stats}
+
+    except Exception as e:
+        print(f"🔥 Upload failed: {e}")
+        return {"status": "error", "message": str(e)}
+    finally:
+        if path is not None:
+            os.remove(path)
+
+@app.get("/documents")
+async def list_documents(tenant: Optional[str] = None):
+    return {"documents": await scheduler.embedder.run(faiss_index.list_documents, tenant)}
+
+def remove_document(doc_id: str) -> int:
+    removed = faiss_index.remove_document(doc_id)
+    faiss_index.save()
+    return removed
+
+@app.delete("/documents/{doc_id}")
+async def delete_document(doc_id: str):
+    try:
+        removed = await scheduler.embedder.run(remove_document, doc_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown document id '{doc_id}'.")
+    return {"status": "success", "doc_id": doc_id, "chunks": removed}
 
 class QueryRequest(BaseModel):
     question: str
+    doc_ids: Optional[List[str]] = None # Only search these documents
+    tenant: Optional[str] = None        # Only search this tenant's documents
 
-@app.post("/query")
-async def query_documents(query: QueryRequest):
-    query_embedding = embedding_model.get_embedding(query.question)
-    top_chunks = faiss_index.search(query_embedding)
+def search_chunks(query_embedding, doc_ids=None, tenant=None):
+    if tenant is not None:
+        tenant_docs = {doc["doc_id"] for doc in faiss_index.list_documents(tenant=tenant)}
+        doc_ids = [d for d in doc_ids if d in tenant_docs] if doc_ids is not None else list(tenant_docs)
+    return faiss_index.search(query_embedding, top_k=CONTEXT_CANDIDATE_CHUNKS, doc_ids=doc_ids)
+
+PROMPT_TEMPLATE = "Answer the question based on the context below.\n\nContext:\n{context}\n\nQuestion: {question}"
+
+def pack_prompt(question: str, query_embedding, top_chunks) -> str:
+    """Fills PROMPT_TEMPLATE with the most relevant sentences that fit next to the answer in n_ctx."""
+    empty_prompt = PROMPT_TEMPLATE.format(context="", question=question)
+    budget = context_budget(empty_prompt, count_tokens, N_CTX, MAX_ANSWER_TOKENS, CONTEXT_MAX_TOKENS)
+    context = pack_context(query_embedding, top_chunks, embedding_model, count_tokens, budget)
+    return PROMPT_TEMPLATE.format(context=context, question=question)
+
+async def build_prompt(question: str, query_embedding, doc_ids=None, tenant=None) -> str:
+    top_chunks = await scheduler.embedder.run(search_chunks, query_embedding, doc_ids, tenant)
+    return await scheduler.embedder.run(pack_prompt, question, query_embedding, top_chunks)
 
-    # Combine chunks into a prompt
-    context = "\n".join(top_chunks)
-    prompt = f"Answer the question based on the context below.\n\nContext:\n{context}\n\nQuestion: {query.question}"
+def index_version():
+    return faiss_index.version
 
-    response = generate_answer(prompt)
+def answer_scope(query: QueryRequest):
+    """What an answer depends on besides the question and the index contents."""
+    return (tuple(sorted(query.doc_ids)) if query.doc_ids is not None else None, query.tenant)
+
+@app.post("/query")
+async def query_documents(query: QueryRequest):
+    query_embedding = await scheduler.embedder.embed(query.question)
+    # Read before searching, so an answer racing an upload is not cached as current. On the embedding
+    # thread like every other index access: a ShardedIndex asks its shards for their versions
+    version = await scheduler.embedder.run(index_version)
+    cached = answer_cache.get(query_embedding, version, answer_scope(query))
+    if cached is not None:
+        return {"answer": cached, "cached": True}
+    prompt = await build_prompt(query.question, query_embedding, query.doc_ids, query.tenant)
+    response = await scheduler.generator.generate(prompt)
+    answer_cache.put(query_embedding, version, response, answer_scope(query))
     return {"answer": response}
-@app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
-    try:
-        content = await file.read()
-        text = content.decode("utf-8")
 
-        chunks = split_text(text)
-        for chunk in chunks:
-            emb = embedding_model.get_embedding(chunk)
-            faiss_index.add(emb, chunk)
+@app.post("/query/stream")
+async def query_documents_stream(query: QueryRequest):
+    """
+    Server-sent events variant of /query: one `data:` event per generated piece, then a `done` event.
+    A cached answer is sent as a single piece.
+    """
+    query_embedding = await scheduler.embedder.embed(query.question)
+    version = await scheduler.embedder.run(index_version)
+    cached = answer_cache.get(query_embedding, version, answer_scope(query))
+    if cached is not None:
+        pieces = None
+    else:
+        prompt = await build_prompt(query.question, query_embedding, query.doc_ids, query.tenant)
+        pieces = scheduler.generator.stream(prompt) # Raises QueueFullError (429) before the stream starts
 
-        return {"status": "success", "chunks": len(chunks)}
+    async def events():
+        if pieces is None:
+            yield f"data: {json.dumps({'token': cached})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'cached': True})}\n\n"
+            return
+        answer = []
+        try:
+            async for piece in pieces:
+                answer.append(piece)
+                yield f"data: {json.dumps({'token': piece})}\n\n"
+            answer_cache.put(query_embedding, version, "".join(answer).strip(), answer_scope(query))
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            print(f"🔥 Streaming query failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'message': str(e)})}\n\n"
 
-    except Exception as e:
-        print(f"🔥 Upload failed: {e}")
-        return {"status": "error", "message": str(e)}
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
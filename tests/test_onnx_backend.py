@@ -0,0 +1,35 @@
+# File: tests/test_onnx_backend.py
+"""
+The ONNX backends must stay within the benchmark's cosine tolerance of the PyTorch embeddings
+(see benchmarks/bench_embedding_backends.py). Skipped where onnxruntime or the model is unavailable.
+"""
+
+import pytest
+
+from app.core.embedding_model import EmbeddingModel
+from benchmarks.bench_embedding_backends import TOLERANCE, cosines
+
+MODEL_NAME = "sentence-transformers/paraphrase-MiniLM-L3-v2" # The model the app serves
+TEXTS = [
+    "Employees may carry over up to five days of unused annual leave into the next calendar year.",
+    "Visitors must sign in at the front desk and wear a badge at all times.",
+    "The district reimburses mileage for travel between school sites at the federal rate.",
+    "Short.",
+    " ".join(["Requests for remote work are reviewed by the employee's manager and human resources."] * 20),
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    try:
+        return EmbeddingModel(model_name=MODEL_NAME).get_embeddings(TEXTS)
+    except Exception as e: # No network and no local copy of the model
+        pytest.skip(f"Embedding model unavailable: {e}")
+
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-int8"])
+def test_onnx_matches_torch(backend, reference, tmp_path):
+    pytest.importorskip("onnxruntime")
+    model = EmbeddingModel(model_name=MODEL_NAME, backend=backend, onnx_dir=str(tmp_path))
+    similarity = cosines(reference, model.get_embeddings(TEXTS))
+    assert similarity.min() >= TOLERANCE, f"{backend}: cosine to PyTorch {similarity.min():.5f} < {TOLERANCE}"
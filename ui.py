@@ -3,155 +3,177 @@
 import gradio as gr
 import os
 import traceback
-import tempfile
-import piper    # For Text-to-Speech
-import wave     # For writing WAV file correctly
+import time
 
 # Core components
-from app.core.embedding_model import EmbeddingModel
-from app.core.faiss_wrapper import FaissIndex
-from app.core.llm import generate_answer
+from app.core.lazy import LazyModel
+from app.core.speech import AudioCache, SentenceSpeaker
+from app.core.answer_cache import AnswerCache
+from app.core.context_packer import context_budget, pack_context
+from app.core.llm import MAX_ANSWER_TOKENS, N_CTX, count_tokens, generate_answer_stream, llm
+from app.core.settings import (ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_SIZE, CONTEXT_CANDIDATE_CHUNKS, CONTEXT_MAX_TOKENS,
+                               load_embedding_model, open_vector_index)
 
 # Utils and Agents
-from app.utils.chunker import split_text
-from app.utils.file_reader import extract_text_from_raw # Import the updated extractor
+from app.utils.file_reader import extract_text_from_raw, SUPPORTED_EXTENSIONS # Import the updated extractor
+from app.utils.pipeline import ingest_file
+from app.utils.bulk_ingest import file_hash
 from app.agent.policy_reviewer import analyze_policies
 
 # --- Initialization ---
-tts_voice = None # Variable to hold the loaded voice
-embedder = None
-faiss_index = None
-try:
-    # Initialize Embedder and FAISS
-    embedder = EmbeddingModel(model_name="sentence-transformers/paraphrase-MiniLM-L3-v2")
-    faiss_index = FaissIndex(dim=384)
-    print("Embedder and FAISS initialized successfully.")
-
-    # ---- Initialize Piper TTS ----
-    # Define paths based on your project structure
-    model_path = "app/models/tts/en_US-danny-low.onnx"
-    config_path = "app/models/tts/en_US-danny-low.onnx.json"
-
-    if os.path.exists(model_path) and os.path.exists(config_path):
-        print(f"Loading Piper TTS voice from: {model_path}")
-        try:
-            from piper.voice import PiperVoice # Ensure correct import if needed
-            tts_voice = PiperVoice.load(model_path, config_path=config_path)
-            print("Piper TTS voice (en_US-danny-low) loaded successfully.")
-        except Exception as piper_e:
-             print(f"Could not initialize Piper TTS voice with PiperVoice.load. Error: {piper_e}")
-             print("Please check piper-tts documentation or installation.")
-             tts_voice = None # Ensure it's None if loading failed
-    else:
+AUDIO_CACHE_DIR = "audio_cache"
+AUDIO_CACHE_MB = int(os.environ.get("AUDIO_CACHE_MB", "256")) # Synthesized sentences kept on disk
+PROMPT_TEMPLATE = """Based *only* on the following context..., answer the question....
+Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"""
+# Define paths based on your project structure
+model_path = "app/models/tts/en_US-danny-low.onnx"
+config_path = "app/models/tts/en_US-danny-low.onnx.json"
+
+def load_tts_voice():
+    """ Loads the Piper voice, or returns None (TTS disabled) if it is missing or fails to load. """
+    if not (os.path.exists(model_path) and os.path.exists(config_path)):
         print(f"Warning: Piper TTS voice files not found at specified paths:")
         print(f"Model: {model_path}")
         print(f"Config: {config_path}")
         print("TTS functionality will be disabled.")
+        return None
+    print(f"Loading Piper TTS voice from: {model_path}")
+    try:
+        from piper.voice import PiperVoice # Ensure correct import if needed
+        voice = PiperVoice.load(model_path, config_path=config_path)
+        print("Piper TTS voice (en_US-danny-low) loaded successfully.")
+        return voice
+    except Exception as piper_e:
+        print(f"Could not initialize Piper TTS voice with PiperVoice.load. Error: {piper_e}")
+        print("Please check piper-tts documentation or installation.")
+        return None
 
+# Models are loaded on first use, or in the background from launch (see __main__), so the UI comes up right away
+embedder = LazyModel("embedder", load_embedding_model)
+tts_voice = LazyModel("Piper TTS voice", load_tts_voice)
+audio_cache = AudioCache(os.path.basename(model_path), AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MB << 20)
+answer_cache = AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_SIMILARITY) # Emptied whenever faiss_index.version changes
+faiss_index = None
+try:
+    faiss_index = open_vector_index() # Warm restart from the last saved index; memory-mapped
+    print("FAISS initialized successfully.")
 except Exception as e:
-    print(f"FATAL ERROR: Could not initialize models or TTS: {e}")
+    print(f"FATAL ERROR: Could not initialize FAISS index: {e}")
     print(traceback.format_exc())
-    # Set to None to prevent errors later and indicate failure
-    if embedder is not None: embedder = None # Avoid partially initialized state
-    if faiss_index is not None: faiss_index = None
-    if tts_voice is not None: tts_voice = None
 
 # --- Core Functions ---
 
 def upload_file(file_obj):
-    """ Handles file upload, text extraction, chunking, embedding, and indexing. """
-    if embedder is None or faiss_index is None: return "Error: Models not initialized."
+    """ Handles file upload, text extraction, chunking, embedding, and indexing. Other documents stay indexed. """
+    if faiss_index is None: return "Error: Models not initialized."
     if not file_obj or not hasattr(file_obj, 'name'): return "Error: No file uploaded."
+    doc_id = None
     try:
-        faiss_index.reset()
-        print("Previous FAISS index cleared.")
         file_path = file_obj.name
         file_basename = os.path.basename(file_path)
         print(f"Processing file: {file_basename}")
         ext = os.path.splitext(file_path)[1].lower()
         if not ext: return f"Error: Could not determine file extension for '{file_basename}'."
-        extracted_text = extract_text_from_raw(file_path, ext) # Use updated extractor
-        if not extracted_text or not extracted_text.strip(): return f"Error: Could not extract readable text from '{file_basename}'. Check logs."
-        chunks = split_text(extracted_text)
-        if not chunks: return f"Error: Text extracted but could not be split into chunks."
-        print(f"Generating embeddings and indexing {len(chunks)} chunks...")
-        count = 0
-        for chunk in chunks:
-            emb = embedder.get_embedding(chunk)
-            if emb is not None: faiss_index.add(emb, chunk); count += 1
-            else: print(f"Warning: Could not generate embedding for chunk: {chunk[:100]}...")
-        if count == 0: return "Error: Indexing failed. Could not generate embeddings."
+        if ext not in SUPPORTED_EXTENSIONS: return f"Error: Unsupported file type '{ext}'."
+        previous = faiss_index.list_documents(filename=file_basename)
+        doc_id = faiss_index.new_document(file_basename, content_hash=file_hash(file_path)) # Lets bulk ingestion skip it
+        print("Extracting, chunking, embedding and indexing as a stream...")
+        count = ingest_file(file_path, ext, embedder, faiss_index, doc_id=doc_id) # Embedding starts with the first pages
+        if count == 0:
+            faiss_index.remove_document(doc_id)
+            return f"Error: Could not extract readable text from '{file_basename}'. Check logs."
+        for doc in previous: # A re-upload replaces the earlier version
+            faiss_index.remove_document(doc["doc_id"])
+        faiss_index.save()
+        print(f"Embedding cache: {embedder.cache.stats}")
         print(f"Successfully indexed {count} chunks from {file_basename}.")
-        return f"✅ Uploaded & indexed {count} chunks from '{file_basename}'."
+        return f"✅ Uploaded & indexed {count} chunks from '{file_basename}'. Documents indexed: {len(faiss_index.documents)}."
     except Exception as e:
         print(f"Error during file upload/indexing: {e}"); traceback.print_exc()
+        if doc_id in faiss_index.documents: faiss_index.remove_document(doc_id) # Drop a partial upload
         return f"❌ An error occurred during processing: {str(e)}."
 
-def ask_question(question):
-    """ Handles question, searches, generates text answer, AND generates speech using wave module. """
-    audio_filepath = None
-    if embedder is None or faiss_index is None: return ["Error: Models not initialized.", None]
-    if not question or not question.strip(): return ["Please enter a question.", None]
-    if not faiss_index.is_ready(): return ["⚠️ Please upload and index a document first.", None]
-
+def _selected_doc_ids(filenames):
+    """ Maps a comma-separated list of filenames to document ids; None means all documents. """
+    names = [name.strip() for name in (filenames or "").split(",") if name.strip()]
+    if not names: return None
+    return [doc["doc_id"] for name in names for doc in faiss_index.list_documents(filename=name)]
+
+def list_documents():
+    """ Lists the indexed documents. """
+    if faiss_index is None: return "Error: Models not initialized."
+    docs = faiss_index.list_documents()
+    if not docs: return "No documents indexed."
+    return "\n".join(f"{doc['filename']} — {doc['chunks']} chunks, uploaded {time.strftime('%Y-%m-%d %H:%M', time.localtime(doc['uploaded_at']))}" for doc in docs)
+
+def remove_document(filename):
+    """ Removes a document (by filename) from the index without touching the others. """
+    if faiss_index is None: return "Error: Models not initialized."
+    docs = faiss_index.list_documents(filename=(filename or "").strip())
+    if not docs: return f"Error: No indexed document named '{filename}'.\n\n{list_documents()}"
+    try:
+        removed = sum(faiss_index.remove_document(doc["doc_id"]) for doc in docs)
+        faiss_index.save()
+        return f"🗑️ Removed {removed} chunks of '{filename}'.\n\n{list_documents()}"
+    except Exception as e:
+        print(f"Error removing document: {e}"); traceback.print_exc()
+        return f"❌ An error occurred: {str(e)}."
+
+def ask_question(question, documents=""):
+    """
+    Handles question, searches, and streams the text answer as it is generated. Each finished
+    sentence is spoken by Piper on a worker thread meanwhile and streamed to the audio output.
+    """
+    if faiss_index is None: yield ["Error: Models not initialized.", None]; return
+    if not question or not question.strip(): yield ["Please enter a question.", None]; return
+    if not faiss_index.is_ready(): yield ["⚠️ Please upload and index a document first.", None]; return
+
+    speaker = None
     try:
         print(f"Received question: {question}")
         query_emb = embedder.get_embedding(question)
-        if query_emb is None: return ["Error: Could not generate embedding for the question.", None]
-        top_chunks = faiss_index.search(query_emb, top_k=3)
-        if not top_chunks: return ["Could not find relevant context in the document.", None]
-
-        print(f"Found {len(top_chunks)} relevant chunks.")
-        context = "\n\n---\n\n".join(top_chunks)
-        max_context_len = 2500
-        if len(context) > max_context_len: context = context[:max_context_len] + "..."
-
-        prompt = f"""Based *only* on the following context..., answer the question....
-Context:\n{context}\n\nQuestion: {question}\n\nAnswer:"""
-
-        print("Generating text answer...")
-        answer_text = generate_answer(prompt)
-        print("Text answer generated.")
-
-        # --- Generate Speech using wave module ---
-        if tts_voice and answer_text:
-            model_basename = os.path.basename(model_path) # Get model name for logging
-            print(f"Generating speech using {model_basename}...")
-            wav_write_obj = None # For finally block
-            try:
-                # 1. Create a temporary file path (file persists until cleaned up)
-                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_f:
-                    audio_filepath = tmp_f.name
-
-                # 2. Open the path with wave module in write binary mode
-                wav_write_obj = wave.open(audio_filepath, 'wb')
-
-                # 3. Pass the wave object to piper synthesize
-                # Piper will set parameters (framerate etc.) and write frames here
-                tts_voice.synthesize(answer_text, wav_write_obj)
-
-                print(f"Speech generated and saved to: {audio_filepath}")
-
-            except Exception as tts_e:
-                print(f"Error during TTS synthesis: {tts_e}")
-                traceback.print_exc()
-                audio_filepath = None # Ensure path is None on error
-                if audio_filepath and os.path.exists(audio_filepath): # Cleanup failed file
-                     try: os.remove(audio_filepath); print(f"Cleaned failed audio file: {audio_filepath}")
-                     except OSError as e_rem: print(f"Error removing failed audio file {audio_filepath}: {e_rem}")
-            finally:
-                # 4. Ensure the wave file object is closed to finalize header
-                if wav_write_obj:
-                    wav_write_obj.close()
-        elif not tts_voice:
-             print("Skipping speech generation: TTS voice not loaded.")
-        # --- End Speech Generation ---
-
-        return [answer_text, audio_filepath]
+        if query_emb is None: yield ["Error: Could not generate embedding for the question.", None]; return
+        doc_ids = _selected_doc_ids(documents)
+        if doc_ids == []: yield [f"⚠️ No indexed document matches '{documents}'.", None]; return
+        version = faiss_index.version
+        scope = tuple(sorted(doc_ids)) if doc_ids is not None else None
+        speaker = SentenceSpeaker(tts_voice.get, audio_cache) # Waits for the voice on its own thread
+        answer_text = answer_cache.get(query_emb, version, scope)
+        if answer_text is not None:
+            print("Answer found in the answer cache.")
+            speaker.feed(answer_text)
+            yield [answer_text, None]
+        else:
+            top_chunks = faiss_index.search(query_emb, top_k=CONTEXT_CANDIDATE_CHUNKS, doc_ids=doc_ids) # Filtered inside FAISS
+            if not top_chunks: yield ["Could not find relevant context in the document.", None]; return
+
+            print(f"Found {len(top_chunks)} relevant chunks.")
+            # Pack the most relevant sentences into the tokens left next to the answer in n_ctx
+            budget = context_budget(PROMPT_TEMPLATE.format(context="", question=question), count_tokens,
+                                    N_CTX, MAX_ANSWER_TOKENS, CONTEXT_MAX_TOKENS)
+            context = pack_context(query_emb, top_chunks, embedder, count_tokens, budget, separator="\n\n---\n\n")
+            prompt = PROMPT_TEMPLATE.format(context=context, question=question)
+
+            print("Generating text answer...")
+            answer_text = ""
+            for piece in generate_answer_stream(prompt):
+                answer_text += piece
+                speaker.feed(piece)
+                yield [answer_text, speaker.take()] # Audio of sentences finished so far, if any
+            answer_text = answer_text.strip()
+            answer_cache.put(query_emb, version, answer_text, scope)
+            print("Text answer generated.")
+
+        speaker.close()
+        for audio in speaker.remaining(): # Sentences still being synthesized
+            yield [answer_text, audio]
 
     except Exception as e:
         print(f"Error during question answering: {e}"); traceback.print_exc()
-        return [f"❌ An error occurred: {str(e)}", None]
+        yield [f"❌ An error occurred: {str(e)}", None]
+    finally:
+        if speaker is not None:
+            speaker.cancel() # No-op once finished; stops synthesis if the client went away
 
 def run_review_agent(file_obj):
     """ Handles file upload for policy review, runs analysis, returns report file. """
@@ -179,21 +201,27 @@ def run_review_agent(file_obj):
 upload_input = gr.File(label="Upload Document", file_types=[".txt", ".pdf", ".docx"])
 upload_output = gr.Textbox(label="Indexing Status", interactive=False)
 qa_input = gr.Textbox(lines=3, placeholder="Enter your question here...", label="Ask a Question")
+qa_documents = gr.Textbox(placeholder="Leave blank to search all documents", label="Only search these files (comma-separated)")
 qa_output_text = gr.Textbox(label="Answer", interactive=False)
-qa_output_audio = gr.Audio(label="Spoken Answer (en_US-danny-low)", type="filepath", autoplay=False)
+qa_output_audio = gr.Audio(label="Spoken Answer (en_US-danny-low)", streaming=True, autoplay=True)
 review_input = gr.File(label="Upload Policy Document", file_types=[".txt", ".pdf", ".docx"])
 review_output = gr.File(label="Download Review Report")
+documents_input = gr.Textbox(placeholder="Filename to remove, e.g. handbook.pdf", label="Remove Document")
+documents_output = gr.Textbox(label="Indexed Documents", interactive=False)
 
 upload_ui = gr.Interface(fn=upload_file, inputs=upload_input, outputs=upload_output, title="📄 1. Upload & Index")
-query_ui = gr.Interface(fn=ask_question, inputs=qa_input, outputs=[qa_output_text, qa_output_audio], title="💬 2. Ask Question")
+query_ui = gr.Interface(fn=ask_question, inputs=[qa_input, qa_documents], outputs=[qa_output_text, qa_output_audio], title="💬 2. Ask Question")
 review_ui = gr.Interface(fn=run_review_agent, inputs=review_input, outputs=review_output, title="📋 3. Policy Review")
+documents_ui = gr.Interface(fn=remove_document, inputs=documents_input, outputs=documents_output, title="🗂️ 4. Documents")
 
-app = gr.TabbedInterface([upload_ui, query_ui, review_ui], ["Upload & Index", "Ask Question", "Review Policy"])
+app = gr.TabbedInterface([upload_ui, query_ui, review_ui, documents_ui], ["Upload & Index", "Ask Question", "Review Policy", "Documents"])
 
 # --- Launch the App ---
 if __name__ == "__main__":
     print("Launching Gradio App...")
-    if embedder is not None and faiss_index is not None:
+    if faiss_index is not None:
+        for model in (embedder, llm, tts_voice): # Warm up in the background while the UI starts serving
+            model.start()
         app.launch(
             show_error=True,
             server_name="0.0.0.0",   # 👈 Add this line
@@ -201,6 +229,6 @@ if __name__ == "__main__":
         )
     else:
         print("-----------------------------------------------------")
-        print("ERROR: Cannot launch - models failed init.")
+        print("ERROR: Cannot launch - FAISS index failed init.")
         print("-----------------------------------------------------")
         
\ No newline at end of file